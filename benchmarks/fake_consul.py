@@ -0,0 +1,97 @@
+"""
+In-memory stand-in for the python-consul client used by shared/consul_utils.py
+Supports the calls the services make: agent.service.register/deregister,
+agent.services/checks and blocking health.service queries.
+"""
+import re
+import sys
+import types
+import threading
+
+_DURATION_RE = re.compile(r'^(\d+(?:\.\d+)?)(ms|s|m)?$')
+
+
+def _seconds(wait):
+    if wait is None:
+        return None
+    match = _DURATION_RE.match(str(wait))
+    if not match:
+        return None
+    value, unit = float(match.group(1)), match.group(2) or 's'
+    return value / 1000 if unit == 'ms' else value * 60 if unit == 'm' else value
+
+
+class _Registry:
+    def __init__(self):
+        self.services = {}
+        self.index = 1
+        self.changed = threading.Condition()
+
+    def bump(self):
+        with self.changed:
+            self.index += 1
+            self.changed.notify_all()
+
+
+_registry = _Registry()
+
+
+class _AgentService:
+    def register(self, name, service_id=None, address=None, port=None, tags=None, check=None, **kwargs):
+        service_id = service_id or name
+        _registry.services[service_id] = {
+            'ID': service_id, 'Service': name, 'Address': address or '127.0.0.1',
+            'Port': port, 'Tags': list(tags or []),
+        }
+        _registry.bump()
+        return True
+
+    def deregister(self, service_id):
+        _registry.services.pop(service_id, None)
+        _registry.bump()
+        return True
+
+
+class _Agent:
+    def __init__(self):
+        self.service = _AgentService()
+
+    def services(self):
+        return dict(_registry.services)
+
+    def checks(self):
+        return {}
+
+
+class _Health:
+    def service(self, service, index=None, wait=None, passing=None, **kwargs):
+        # Blocking query: wait until the registry changes past `index` or the wait expires
+        if index is not None:
+            with _registry.changed:
+                _registry.changed.wait_for(lambda: str(_registry.index) != str(index), timeout=_seconds(wait) or 5)
+        nodes = [
+            {'Node': {'Node': 'benchmark'}, 'Service': dict(entry), 'Checks': []}
+            for entry in _registry.services.values() if entry['Service'] == service
+        ]
+        return str(_registry.index), nodes
+
+
+class Consul:
+    def __init__(self, host='127.0.0.1', port=8500, **kwargs):
+        self.agent = _Agent()
+        self.health = _Health()
+
+
+class Check:
+    @staticmethod
+    def http(url, interval=None, timeout=None, **kwargs):
+        return {'http': url, 'interval': interval, 'timeout': timeout}
+
+
+def install():
+    """Register this module as `consul` before shared.consul_utils is imported"""
+    module = types.ModuleType('consul')
+    module.Consul = Consul
+    module.Check = Check
+    sys.modules['consul'] = module
+    return module
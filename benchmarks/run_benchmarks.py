@@ -0,0 +1,405 @@
+"""
+Benchmark suite for the order, product and login hot paths
+
+Brings microUsers, microProducts and microOrders up in-process against
+SQLite files and an in-memory fake Consul. microProducts is served on a
+local port so microOrders reaches it over real HTTP through the
+discovery-backed client. Scripted workloads:
+
+    catalog     product listing pages, single product reads, name search
+    checkout    POST /api/orders with carts of 1-50 items, then outbox drain
+    login       bursts of POST /api/login across seeded users
+    contention  concurrent checkouts of one SKU with limited stock
+
+Each scenario reports throughput and p50/p95/p99 latency. Results are saved
+as JSON (benchmarks/results/<commit>.json by default) and can be compared
+with an earlier run:
+
+    python benchmarks/run_benchmarks.py --requests 500 --concurrency 8
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/abc1234.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+SERVICES = {
+    'microusers': ('microUsers', 'users'),
+    'microproducts': ('microProducts', 'products'),
+    'microorders': ('microOrders', 'orders'),
+}
+# Top-level module names every service defines; cleared between service imports
+SERVICE_MODULES = ('config', 'db', 'run', 'migrations', 'users', 'products', 'orders')
+
+SCENARIOS = ('catalog', 'checkout', 'login', 'contention')
+CATALOG_SIZE = 2000
+LOGIN_USERS = 50
+LOGIN_PASSWORD = 'benchmark-password'
+
+
+def configure_environment(workdir):
+    """Settings read at import time by config.py and the shared modules"""
+    os.environ.update({
+        'SERVER_MODE': 'development',
+        'CONSUL_HOST': '127.0.0.1',
+        'SESSION_BACKEND': 'memory',
+        'TRACING_EXPORTER': os.getenv('TRACING_EXPORTER', 'none'),
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+        'OUTBOX_RELAY_ENABLED': 'false',
+        # The limiter would otherwise turn most of a login burst into 429s
+        'LOGIN_USER_RATE_PER_MINUTE': '1000000',
+        'LOGIN_USER_BURST': '1000000',
+        'LOGIN_IP_RATE_PER_MINUTE': '1000000',
+        'LOGIN_IP_BURST': '1000000',
+        'HTTP_MAX_RETRIES': '0',
+    })
+    sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+    import fake_consul
+    fake_consul.install()
+
+
+def load_service(service_name, workdir):
+    """Import one service's app against its own SQLite file and apply its migrations"""
+    directory, package = SERVICES[service_name]
+    service_dir = os.path.join(REPO_ROOT, directory)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, service_name)}.db"
+    os.environ['SERVICE_NAME'] = service_name
+
+    for module in list(sys.modules):
+        if module.split('.')[0] in SERVICE_MODULES:
+            del sys.modules[module]
+    sys.path.insert(0, service_dir)
+    try:
+        import importlib
+        app = importlib.import_module(f'{package}.views').app
+        importlib.import_module('run')  # registers every model
+        db = importlib.import_module('db.db').db
+        from shared.migrations import apply_migrations
+        with app.app_context():
+            apply_migrations(db.engine, service_name)
+        modules = {name: module for name, module in sys.modules.items() if name.split('.')[0] in SERVICE_MODULES}
+    finally:
+        sys.path.remove(service_dir)
+    return app, db, modules
+
+
+def serve_in_background(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return server
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_load(app, total, concurrency, make_request, expected=(200,)):
+    """
+    Sends total requests from concurrency threads, each with its own test client.
+
+    make_request(client, i) must return a response.
+    """
+    local = threading.local()
+    latencies = [0.0] * total
+    statuses = [0] * total
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        start = time.perf_counter()
+        try:
+            statuses[i] = make_request(client, i).status_code
+        except Exception:
+            statuses[i] = -1
+        latencies[i] = time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    status_codes = {}
+    for status in statuses:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': sum(1 for status in statuses if status not in expected),
+        'status_codes': status_codes,
+        'duration_s': round(elapsed, 4),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / total * 1000, 3) if total else 0.0,
+            'p50': round(percentile(ordered, 0.50) * 1000, 3),
+            'p95': round(percentile(ordered, 0.95) * 1000, 3),
+            'p99': round(percentile(ordered, 0.99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+
+class Environment:
+    """The three services loaded in-process, seeded and wired together"""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+        self.products_app, self.products_db, products = load_service('microproducts', workdir)
+        self.Products = products['products.models.product_model'].Products
+        self._seed_products()
+        self.products_server = serve_in_background(self.products_app)
+        products_port = self.products_server.server_port
+
+        # microOrders finds microProducts through the (fake) Consul registry
+        from shared.consul_utils import get_consul_client
+        get_consul_client().register_service('microproducts', products_port)
+        os.environ['PRODUCTS_SERVICE_URL'] = f'http://127.0.0.1:{products_port}'
+        self.orders_app, self.orders_db, orders = load_service('microorders', workdir)
+        self.relay_once = orders['orders.outbox'].relay_once
+        self.Orders = orders['orders.models.order_model'].Orders
+
+        self.users_app, self.users_db, users = load_service('microusers', workdir)
+        self.Users = users['users.models.user_model'].Users
+        self._seed_users()
+
+    def _seed_products(self):
+        with self.products_app.app_context():
+            if self.Products.query.count() < CATALOG_SIZE:
+                self.products_db.session.bulk_insert_mappings(self.Products, [
+                    {'name': f'product-{i:05d}', 'price': 10 + i % 90, 'quantity': 10 ** 9}
+                    for i in range(CATALOG_SIZE)
+                ])
+                self.products_db.session.commit()
+            self.product_ids = [row[0] for row in self.products_db.session.query(self.Products.id).all()]
+
+    def _seed_users(self):
+        from shared.passwords import hash_password
+        with self.users_app.app_context():
+            existing = {row[0] for row in self.users_db.session.query(self.Users.username).all()}
+            password = hash_password(LOGIN_PASSWORD)
+            self.users_db.session.bulk_insert_mappings(self.Users, [
+                {'name': f'bench {i}', 'email': f'bench{i}@example.com', 'username': f'bench{i}', 'password': password}
+                for i in range(LOGIN_USERS) if f'bench{i}' not in existing
+            ])
+            self.users_db.session.commit()
+
+    def drain_outbox(self, timeout=120.0):
+        """Run the relay until no pending event is left; returns seconds spent"""
+        started = time.perf_counter()
+        with self.orders_app.app_context():
+            while time.perf_counter() - started < timeout:
+                if self.relay_once() == 0:
+                    from sqlalchemy import text
+                    pending = self.orders_db.session.execute(
+                        text("SELECT COUNT(*) FROM outbox_events WHERE status = 'pending'")
+                    ).scalar()
+                    self.orders_db.session.rollback()
+                    if not pending:
+                        break
+        return round(time.perf_counter() - started, 4)
+
+    def order_statuses(self, order_ids):
+        with self.orders_app.app_context():
+            rows = self.orders_db.session.query(self.Orders.status).filter(self.Orders.id.in_(order_ids)).all()
+        counts = {}
+        for (status,) in rows:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+        self.products_server.shutdown()
+
+
+def scenario_catalog(env, total, concurrency, rng):
+    product_ids = env.product_ids
+
+    def request(client, i):
+        roll = rng.random()
+        if roll < 0.6:
+            return client.get(f'/api/products?limit=50&after={rng.choice(product_ids)}')
+        if roll < 0.9:
+            return client.get(f'/api/products/{rng.choice(product_ids)}')
+        return client.get(f'/api/products?limit=20&name=product-0{rng.randint(0, 9)}')
+
+    return run_load(env.products_app, total, concurrency, request)
+
+
+def scenario_checkout(env, total, concurrency, rng):
+    product_ids = env.product_ids
+    created = []
+    created_lock = threading.Lock()
+
+    def request(client, i):
+        cart = rng.sample(product_ids, rng.randint(1, 50))
+        response = client.post('/api/orders', json={
+            'userName': f'bench {i % LOGIN_USERS}',
+            'userEmail': f'bench{i % LOGIN_USERS}@example.com',
+            'products': [{'id': product_id, 'quantity': 1} for product_id in cart],
+        })
+        if response.status_code == 201:
+            with created_lock:
+                created.append(response.get_json()['order']['orderId'])
+        return response
+
+    result = run_load(env.orders_app, total, concurrency, request, expected=(201,))
+    result['outbox_drain_s'] = env.drain_outbox()
+    result['order_status'] = env.order_statuses(created)
+    return result
+
+
+def scenario_login(env, total, concurrency, rng):
+    def request(client, i):
+        return client.post('/api/login', json={'username': f'bench{i % LOGIN_USERS}', 'password': LOGIN_PASSWORD})
+
+    from shared.passwords import PASSWORD_HASH_METHOD
+    result = run_load(env.users_app, total, concurrency, request)
+    result['password_hash_method'] = PASSWORD_HASH_METHOD
+    return result
+
+
+def scenario_contention(env, total, concurrency, rng, stock=None):
+    stock = stock if stock is not None else max(1, total // 3)
+    sku = env.product_ids[-1]
+    with env.products_app.app_context():
+        env.products_db.session.get(env.Products, sku).quantity = stock
+        env.products_db.session.commit()
+    created = []
+    created_lock = threading.Lock()
+
+    def request(client, i):
+        response = client.post('/api/orders', json={
+            'userName': 'contention', 'userEmail': 'contention@example.com',
+            'products': [{'id': sku, 'quantity': 1}],
+        })
+        if response.status_code == 201:
+            with created_lock:
+                created.append(response.get_json()['order']['orderId'])
+        return response
+
+    result = run_load(env.orders_app, total, concurrency, request, expected=(201, 400))
+    result['outbox_drain_s'] = env.drain_outbox()
+    statuses = env.order_statuses(created)
+    with env.products_app.app_context():
+        final_stock = env.products_db.session.get(env.Products, sku).quantity
+    confirmed = statuses.get('confirmed', 0)
+    result.update({
+        'initial_stock': stock,
+        'final_stock': final_stock,
+        'order_status': statuses,
+        # Every confirmed order took exactly one unit and stock never went negative
+        'consistent': final_stock >= 0 and stock - final_stock == confirmed,
+    })
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline):
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for name, result in current['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if not previous:
+            continue
+        def delta(now, before):
+            return f"{(now - before) / before * 100:+.1f}%" if before else 'n/a'
+        print(
+            f"  {name:<11} rps {result['throughput_rps']:>9.1f} ({delta(result['throughput_rps'], previous['throughput_rps'])})"
+            f"  p95 {result['latency_ms']['p95']:>8.2f}ms ({delta(result['latency_ms']['p95'], previous['latency_ms']['p95'])})"
+            f"  p99 {result['latency_ms']['p99']:>8.2f}ms ({delta(result['latency_ms']['p99'], previous['latency_ms']['p99'])})"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=300, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--keep-db', action='store_true', help='keep the SQLite working directory')
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='microservices-bench-')
+    configure_environment(workdir)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    rng = random.Random(args.seed)
+
+    env = Environment(workdir)
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'scenarios': {},
+    }
+    runners = {
+        'catalog': scenario_catalog,
+        'checkout': scenario_checkout,
+        'login': scenario_login,
+        'contention': scenario_contention,
+    }
+    try:
+        for name in selected:
+            result = runners[name](env, args.requests, args.concurrency, rng)
+            results['scenarios'][name] = result
+            latency = result['latency_ms']
+            print(
+                f"{name:<11} {result['throughput_rps']:>9.1f} req/s  p50 {latency['p50']:>8.2f}ms  "
+                f"p95 {latency['p95']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  errors {result['errors']}"
+            )
+    finally:
+        env.close()
+        if not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{results['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == '__main__':
+    main()
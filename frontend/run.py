@@ -1,4 +1,5 @@
-from web.views import app
+from web.views import app, warm_discovery
+from shared.server import run_server
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0',port=5001)
+    run_server(app, 5001, health_path='/', on_worker_start=warm_discovery)
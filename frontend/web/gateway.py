@@ -0,0 +1,174 @@
+"""
+API gateway for the browser
+/gw/<service>/<path> forwards to a healthy instance of the service resolved
+through Consul, over the pooled keep-alive client of shared.http_client.
+Request and response bodies are streamed, never buffered, and every route can
+have its own read timeout. Pages talk to a single origin, so cookies are
+first-party and no CORS preflight is needed.
+"""
+import os
+import logging
+from typing import List, Tuple
+
+import requests
+from flask import Blueprint, Response, jsonify, request
+
+from shared.http_client import CircuitOpenError, get_service_client
+
+gateway = Blueprint('gateway', __name__)
+logger = logging.getLogger(__name__)
+
+GATEWAY_SERVICES = frozenset(
+    name.strip() for name in os.getenv('GATEWAY_SERVICES', 'microusers,microproducts,microorders').split(',')
+)
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv('GATEWAY_CONNECT_TIMEOUT', '2'))
+GATEWAY_READ_TIMEOUT = float(os.getenv('GATEWAY_READ_TIMEOUT', '10'))
+GATEWAY_CHUNK_SIZE = int(os.getenv('GATEWAY_CHUNK_SIZE', '65536'))
+
+# (service, path prefix, read timeout in seconds); the longest matching prefix wins
+DEFAULT_ROUTE_TIMEOUTS = [
+    ('microusers', '/api/login', 5.0),
+    ('microusers', '/api/users/bulk', 60.0),
+    ('microusers', '/api/users/export', 120.0),
+    ('microproducts', '/api/products/bulk', 60.0),
+    ('microproducts', '/api/products/export', 120.0),
+    ('microorders', '/api/orders/export', 120.0),
+]
+
+# Hop-by-hop headers (RFC 7230 6.1) describe one connection and are never forwarded
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade',
+])
+
+
+def _parse_route_timeouts(value: str) -> List[Tuple[str, str, float]]:
+    """GATEWAY_ROUTE_TIMEOUTS entries look like microproducts/api/products/bulk=60"""
+    routes = []
+    for entry in filter(None, (item.strip() for item in value.split(','))):
+        try:
+            target, seconds = entry.rsplit('=', 1)
+            service, _, path = target.partition('/')
+            routes.append((service, '/' + path, float(seconds)))
+        except ValueError:
+            logger.warning(f"Ignoring invalid gateway route timeout '{entry}'")
+    return routes
+
+
+ROUTE_TIMEOUTS = _parse_route_timeouts(os.getenv('GATEWAY_ROUTE_TIMEOUTS', '')) + DEFAULT_ROUTE_TIMEOUTS
+
+
+def route_timeout(service: str, path: str) -> float:
+    """Read timeout for a proxied call"""
+    best, timeout = -1, GATEWAY_READ_TIMEOUT
+    for route_service, prefix, seconds in ROUTE_TIMEOUTS:
+        if route_service == service and path.startswith(prefix) and len(prefix) > best:
+            best, timeout = len(prefix), seconds
+    return timeout
+
+
+class _RequestBody:
+    """Incoming body with a known length, read from the client as the upstream consumes it"""
+
+    def __init__(self, stream, length: int):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def __iter__(self):
+        while True:
+            chunk = self._stream.read(GATEWAY_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _request_body():
+    """Body to forward, or None; chunked uploads are re-sent chunked"""
+    if request.content_length:
+        return _RequestBody(request.stream, request.content_length)
+    # Only the header says there is a body: gunicorn sets wsgi.input_terminated on every request
+    if 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+        return iter(lambda: request.stream.read(GATEWAY_CHUNK_SIZE), b'')
+    return None
+
+
+def _forward_headers(service: str):
+    headers = {
+        name: value for name, value in request.headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in ('host', 'content-length')
+    }
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    client = request.remote_addr or ''
+    headers['X-Forwarded-For'] = f'{forwarded_for}, {client}' if forwarded_for else client
+    headers['X-Forwarded-Host'] = request.host
+    headers['X-Forwarded-Proto'] = request.scheme
+    headers['X-Forwarded-Prefix'] = f'/gw/{service}'
+    return headers
+
+
+def _error(status: int, message: str):
+    response = jsonify({'status': 'error', 'message': message})
+    response.status_code = status
+    return response
+
+
+@gateway.route('/gw/<service>/', defaults={'path': ''},
+               methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+@gateway.route('/gw/<service>/<path:path>',
+               methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+def proxy(service, path):
+    """Forward the request to the service and stream its answer back"""
+    if service not in GATEWAY_SERVICES:
+        return _error(404, f'Service {service} not found')
+
+    upstream_path = '/' + path
+    if request.query_string:
+        upstream_path += '?' + request.query_string.decode('latin-1')
+    body = _request_body()
+
+    try:
+        upstream = get_service_client(service).request(
+            request.method, upstream_path,
+            # A streamed body is consumed by the first attempt and cannot be replayed
+            retries=0 if body is not None else None,
+            headers=_forward_headers(service),
+            data=body,
+            stream=True,
+            allow_redirects=False,
+            timeout=(GATEWAY_CONNECT_TIMEOUT, route_timeout(service, '/' + path)),
+        )
+    except CircuitOpenError as e:
+        return _error(503, str(e))
+    except requests.Timeout:
+        return _error(504, f'{service} did not answer in time')
+    except requests.RequestException as e:
+        logger.error(f"Gateway call to {service}{upstream_path} failed: {e}")
+        return _error(502, f'{service} is unavailable')
+
+    # Raw (still encoded) bytes are relayed, so Content-Encoding and Content-Length stay valid
+    headers = [
+        (name, value) for name, value in upstream.raw.headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    ]
+
+    def generate():
+        completed = False
+        try:
+            for chunk in upstream.raw.stream(GATEWAY_CHUNK_SIZE, decode_content=False):
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                # Fully read: the keep-alive connection goes back to the pool
+                upstream.raw.release_conn()
+            else:
+                # Client went away mid-body: the connection cannot be reused
+                upstream.close()
+
+    return Response(generate(), status=upstream.status_code, headers=headers, direct_passthrough=True)
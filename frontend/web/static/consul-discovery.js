@@ -26,12 +26,14 @@ class ServiceDiscovery {
             const data = await response.json();
             
             if (data.status === 'success') {
+                // Prefer the same-origin gateway: no CORS preflights, one connection
+                const url = data.gateway_url || data.url;
                 // Cache the result
                 this.serviceCache[serviceName] = {
-                    url: data.url,
+                    url: url,
                     timestamp: Date.now()
                 };
-                return data.url;
+                return url;
             } else {
                 throw new Error(data.message || `Service ${serviceName} not found`);
             }
@@ -55,6 +57,9 @@ class ServiceDiscovery {
                 // Update cache
                 const timestamp = Date.now();
                 Object.entries(data.services).forEach(([serviceName, url]) => {
+                    if (data.gateway_prefix) {
+                        url = `${data.gateway_prefix}/${serviceName}`;
+                    }
                     this.serviceCache[serviceName] = { url, timestamp };
                 });
                 return data.services;
@@ -2,15 +2,28 @@ from flask import Flask, render_template, jsonify, request
 from flask_cors import CORS
 import os
 import logging
-from shared.consul_utils import get_consul_client
+from shared.service_resolver import get_service_resolver
+from shared.log import configure_logging, log_event
+from shared.metrics import init_metrics
+from shared.tracing import init_tracing
+from web.gateway import gateway
 
-logging.basicConfig(level=logging.INFO)
+configure_logging('frontend')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'secret123'
-CORS(app, supports_credentials=True)
+# The gateway (/gw/) is same-origin and needs no CORS; reflecting any Origin with
+# credentials there would let other sites call the services with the user's cookies
+CORS(app, supports_credentials=True, resources={r'^(?!/gw/).*': {}})
 app.config.from_object('config.Config')
+init_metrics(app)
+init_tracing(app, 'frontend')
+
+# Same-origin proxy to the microservices (/gw/<service>/...)
+GATEWAY_ENABLED = os.getenv('GATEWAY_ENABLED', 'true').lower() == 'true'
+if GATEWAY_ENABLED:
+    app.register_blueprint(gateway)
 
 
 # Ruta para renderizar el template index.html
@@ -39,17 +52,17 @@ def orders():
 
 @app.route('/editUser/<string:id>')
 def edit_user(id):
-    print("id recibido",id)
+    log_event(logger, logging.DEBUG, 'id recibido', id=id)
     return render_template('editUser.html', id=id)
 
 @app.route('/editProduct/<string:id>')
 def edit_product(id):
-    print("id recibido",id)
+    log_event(logger, logging.DEBUG, 'id recibido', id=id)
     return render_template('editProduct.html', id=id)
 
 @app.route('/editOrder/<string:id>')
 def edit_order(id):
-    print("id recibido",id)
+    log_event(logger, logging.DEBUG, 'id recibido', id=id)
     return render_template('editOrder.html', id=id)
 
 def map_service_to_external_url(service_name, internal_url):
@@ -68,60 +81,99 @@ def map_service_to_external_url(service_name, internal_url):
     
     return internal_url  # fallback
 
+# Discovery answers come from the resolver's in-memory snapshot, kept fresh by
+# Consul blocking queries in the background; browsers may reuse them briefly
+DISCOVERED_SERVICES = ['microusers', 'microproducts', 'microorders']
+SERVICES_MAX_AGE = int(os.getenv('SERVICES_CACHE_MAX_AGE', '10'))
+SERVICES_STALE_WHILE_REVALIDATE = int(os.getenv('SERVICES_STALE_WHILE_REVALIDATE', '30'))
+
+def warm_discovery():
+    """Start the discovery watches so the first page load does not wait for Consul"""
+    resolver = get_service_resolver()
+    for service_name in DISCOVERED_SERVICES:
+        resolver.instances(service_name)
+
+def _internal_service_url(service_name):
+    instances = get_service_resolver().instances(service_name)
+    return instances[0].url if instances else None
+
+def _discovery_response(body, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    if status != 200:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    response.headers['Cache-Control'] = (
+        f'public, max-age={SERVICES_MAX_AGE}, stale-while-revalidate={SERVICES_STALE_WHILE_REVALIDATE}'
+    )
+    # External URLs are derived from the Host the browser used
+    response.vary.add('Host')
+    response.add_etag()
+    return response.make_conditional(request)
+
 @app.route('/api/services/<service_name>')
 def get_service_url(service_name):
     """API endpoint to get service URL via Consul service discovery"""
+    if service_name not in DISCOVERED_SERVICES:
+        # Each name the resolver sees gets a permanent Consul watch: never start one for arbitrary input
+        return _discovery_response({
+            'status': 'error',
+            'message': f'Service {service_name} not found'
+        }, 404)
     try:
-        consul_client = get_consul_client()
-        internal_url = consul_client.get_service_url(service_name)
+        internal_url = _internal_service_url(service_name)
         
         if internal_url:
             # Map to external URL accessible from browser
             external_url = map_service_to_external_url(service_name, internal_url)
-            return jsonify({
+            body = {
                 'status': 'success',
                 'service_name': service_name,
                 'url': external_url,
                 'internal_url': internal_url
-            }), 200
+            }
+            if GATEWAY_ENABLED:
+                body['gateway_url'] = f'/gw/{service_name}'
+            return _discovery_response(body)
         else:
-            return jsonify({
+            return _discovery_response({
                 'status': 'error',
                 'message': f'Service {service_name} not found'
-            }), 404
+            }, 404)
     except Exception as e:
         logger.error(f"Error discovering service {service_name}: {e}")
-        return jsonify({
+        return _discovery_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/services')
 def get_all_services():
     """Get all available services"""
     try:
-        consul_client = get_consul_client()
         services = {}
         
         # Try to discover each expected service
-        service_names = ['microusers', 'microproducts', 'microorders']
-        for service_name in service_names:
-            internal_url = consul_client.get_service_url(service_name)
+        for service_name in DISCOVERED_SERVICES:
+            internal_url = _internal_service_url(service_name)
             if internal_url:
                 # Map to external URL accessible from browser
                 external_url = map_service_to_external_url(service_name, internal_url)
                 services[service_name] = external_url
         
-        return jsonify({
+        body = {
             'status': 'success',
             'services': services
-        }), 200
+        }
+        if GATEWAY_ENABLED:
+            body['gateway_prefix'] = '/gw'
+        return _discovery_response(body)
     except Exception as e:
         logger.error(f"Error getting services: {e}")
-        return jsonify({
+        return _discovery_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 if __name__ == '__main__':
     app.run()
@@ -7,7 +7,11 @@ CREATE TABLE users (
     name varchar(255),
     email varchar(255),
     username varchar(255),
-    password varchar(255)
+    password varchar(255),
+    updatedAt datetime(6) default current_timestamp(6) on update current_timestamp(6),
+    INDEX ix_users_updatedAt (updatedAt),
+    UNIQUE INDEX ix_users_username (username),
+    UNIQUE INDEX ix_users_email (email)
 );
 
 CREATE TABLE products (
@@ -21,10 +25,25 @@ CREATE TABLE orders (
     userName varchar(255),
     userEmail varchar(255),
     saleTotal decimal(10,2),
-    date datetime default current_timestamp);
+    date datetime default current_timestamp,
+    updatedAt datetime(6) default current_timestamp(6) on update current_timestamp(6),
+    INDEX ix_orders_updatedAt (updatedAt),
+    INDEX ix_orders_userEmail_date (userEmail, date),
+    INDEX ix_orders_date (date));
+
+CREATE TABLE order_items (
+    id int NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    order_id int NOT NULL,
+    productId int NOT NULL,
+    name varchar(255),
+    quantity int NOT NULL,
+    price decimal(10,2) NOT NULL,
+    subtotal decimal(10,2) NOT NULL,
+    INDEX ix_order_items_order_id (order_id),
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE);
 
 
-INSERT INTO users VALUES(null, "Admin User", "admin@example.com", "admin", "admin123"),
+INSERT INTO users (id, name, email, username, password) VALUES(null, "Admin User", "admin@example.com", "admin", "admin123"),
     (null, "juan", "juan@gmail.com", "juan", "123"),
     (null, "maria", "maria@gmail.com", "maria", "456");
 
@@ -1,8 +1,16 @@
 import os
+from shared.database import database_uri, engine_options, replica_binds
 
 class Config:
     MYSQL_HOST = os.getenv('DB_HOST', 'localhost')
     MYSQL_USER = os.getenv('DB_USER', 'root')
     MYSQL_PASSWORD = os.getenv('DB_PASSWORD', 'root')
     MYSQL_DB = os.getenv('DB_NAME', 'microservices_db')
-    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DB}'
\ No newline at end of file
+    # DATABASE_URL overrides the MySQL settings (e.g. sqlite:///local.db for local runs)
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', database_uri(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB))
+
+    # Pool sizing, recycling, pre-ping and timeouts come from DB_* environment variables
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Optional read replica (DB_REPLICA_HOST or DATABASE_REPLICA_URL) used by GET requests
+    SQLALCHEMY_BINDS = replica_binds(MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB)
\ No newline at end of file
@@ -0,0 +1,12 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    create_table(conn, sa.Table(
+        'orders', sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('userName', sa.String(255)),
+        sa.Column('userEmail', sa.String(255)),
+        sa.Column('saleTotal', sa.Numeric(10, 2)),
+        sa.Column('date', sa.DateTime, server_default=sa.func.current_timestamp()),
+    ))
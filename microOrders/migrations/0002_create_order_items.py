@@ -0,0 +1,16 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    metadata = sa.MetaData()
+    sa.Table('orders', metadata, sa.Column('id', sa.Integer, primary_key=True))
+    create_table(conn, sa.Table(
+        'order_items', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('order_id', sa.Integer, sa.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True),
+        sa.Column('productId', sa.Integer, nullable=False),
+        sa.Column('name', sa.String(255)),
+        sa.Column('quantity', sa.Integer, nullable=False),
+        sa.Column('price', sa.Numeric(10, 2), nullable=False),
+        sa.Column('subtotal', sa.Numeric(10, 2), nullable=False),
+    ))
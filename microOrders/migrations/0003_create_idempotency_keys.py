@@ -0,0 +1,13 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    create_table(conn, sa.Table(
+        'idempotency_keys', sa.MetaData(),
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('requestHash', sa.String(64), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('responseCode', sa.Integer),
+        sa.Column('responseBody', sa.Text),
+        sa.Column('createdAt', sa.DateTime, nullable=False),
+    ))
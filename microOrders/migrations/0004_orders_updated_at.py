@@ -0,0 +1,7 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+from shared.migrations import add_column, create_index
+
+def upgrade(conn):
+    add_column(conn, 'orders', sa.Column('updatedAt', sa.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')))
+    create_index(conn, 'ix_orders_updatedAt', 'orders', ['updatedAt'])
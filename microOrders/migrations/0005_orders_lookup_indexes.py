@@ -0,0 +1,6 @@
+from shared.migrations import create_index
+
+def upgrade(conn):
+    # Listing filters: by customer (optionally within a date range) and by date range alone
+    create_index(conn, 'ix_orders_userEmail_date', 'orders', ['userEmail', 'date'])
+    create_index(conn, 'ix_orders_date', 'orders', ['date'])
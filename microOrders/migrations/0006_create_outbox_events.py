@@ -0,0 +1,22 @@
+import sqlalchemy as sa
+from shared.migrations import add_column, create_table
+
+def upgrade(conn):
+    # Orders stay 'pending' until the relay has reserved their stock
+    add_column(conn, 'orders', sa.Column('status', sa.String(20)))
+    conn.execute(sa.text("UPDATE orders SET status = 'confirmed' WHERE status IS NULL"))
+
+    create_table(conn, sa.Table(
+        'outbox_events', sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('eventType', sa.String(64), nullable=False),
+        sa.Column('aggregateId', sa.Integer, nullable=False, index=True),
+        sa.Column('payload', sa.Text, nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('lastError', sa.String(255)),
+        sa.Column('createdAt', sa.DateTime, nullable=False),
+        sa.Column('nextAttemptAt', sa.DateTime, nullable=False),
+        sa.Column('deliveredAt', sa.DateTime),
+        sa.Index('ix_outbox_events_status_nextAttemptAt', 'status', 'nextAttemptAt'),
+    ))
@@ -0,0 +1,53 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    metadata = sa.MetaData()
+    sales_deltas = sa.Table(
+        'sales_deltas', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('day', sa.Date, nullable=False, index=True),
+        sa.Column('userEmail', sa.String(255), nullable=False),
+        sa.Column('userName', sa.String(255)),
+        sa.Column('orders', sa.Integer, nullable=False),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False),
+        sa.Column('createdAt', sa.DateTime, nullable=False),
+    )
+    sales_daily = sa.Table(
+        'sales_daily', metadata,
+        sa.Column('day', sa.Date, primary_key=True),
+        sa.Column('orders', sa.Integer, nullable=False),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False),
+    )
+    sales_user_daily = sa.Table(
+        'sales_user_daily', metadata,
+        sa.Column('day', sa.Date, primary_key=True),
+        sa.Column('userEmail', sa.String(255), primary_key=True),
+        sa.Column('userName', sa.String(255)),
+        sa.Column('orders', sa.Integer, nullable=False),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False),
+    )
+    for table in (sales_deltas, sales_daily, sales_user_daily):
+        create_table(conn, table)
+
+    # Backfill from the existing orders; rejected orders are not sales
+    orders = sa.table(
+        'orders', sa.column('date'), sa.column('userEmail'), sa.column('userName'),
+        sa.column('saleTotal'), sa.column('status')
+    )
+    day = sa.func.date(orders.c.date)
+    user_email = sa.func.coalesce(orders.c.userEmail, '')
+    revenue = sa.func.coalesce(sa.func.sum(orders.c.saleTotal), 0)
+    counted = sa.and_(
+        orders.c.date.isnot(None),
+        sa.or_(orders.c.status.is_(None), orders.c.status != 'rejected')
+    )
+    conn.execute(sales_daily.insert().from_select(
+        ['day', 'orders', 'revenue'],
+        sa.select(day, sa.func.count(), revenue).where(counted).group_by(day)
+    ))
+    conn.execute(sales_user_daily.insert().from_select(
+        ['day', 'userEmail', 'userName', 'orders', 'revenue'],
+        sa.select(day, user_email, sa.func.max(orders.c.userName), sa.func.count(), revenue)
+        .where(counted).group_by(day, user_email)
+    ))
@@ -1,38 +1,235 @@
-from flask import Blueprint, request, jsonify, session, g
+from flask import Blueprint, request, jsonify, session, g, abort
 from orders.models.order_model import Orders
+from orders.models.order_item_model import OrderItems
+from orders.models.idempotency_model import IdempotencyKeys
+from orders.models.outbox_model import OutboxEvents
+from orders.products_client import products_client
+from orders.outbox import enqueue_stock_reservation, notify_relay
+from orders.rollups import (
+    record_sale, snapshot_sale, record_sale_change, to_money,
+    sales_by_day, sales_by_user, sales_totals, rebuild_rollups
+)
 from db.db import db
-from datetime import datetime
+import logging
+from shared.log import log_event
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 import requests
+from shared.pagination import wants_unpaginated, parse_page_args, keyset_page, page_response
+from shared.streaming import stream_export
+from shared.responses import shape_rows
+from shared.conditional import collection_validators, page_validators, resource_validators, conditional_json
+from shared.tracing import bind_context
 
 order_controller = Blueprint('order_controller', __name__)
+logger = logging.getLogger(__name__)
+
+# Stored responses are replayed for this long; in-flight claims older than the
+# lock timeout are considered abandoned (worker crashed) and can be taken over
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24')))
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60')))
+
+# Large carts are looked up in chunks of PRODUCTS_BATCH_SIZE ids, at most
+# PRODUCTS_FANOUT chunks in flight at once per worker process
+PRODUCTS_BATCH_SIZE = int(os.getenv('PRODUCTS_BATCH_SIZE', '100'))
+PRODUCTS_FANOUT = int(os.getenv('PRODUCTS_FANOUT', '4'))
+
+STATS_DEFAULT_LIMIT = 100
+STATS_MAX_LIMIT = 1000
+_products_lookup_pool = ThreadPoolExecutor(max_workers=PRODUCTS_FANOUT, thread_name_prefix='products-lookup')
+
+
+def _fetch_products_chunk(product_ids):
+    response = products_client().get(
+        '/api/products',
+        params={'ids': ','.join(str(product_id) for product_id in product_ids)}
+    )
+    if response.status_code != 200:
+        # An upstream failure, not a problem with the order: 503 so the client retries
+        raise requests.RequestException(
+            f'Error al consultar los productos de la orden (HTTP {response.status_code})', response=response
+        )
+    return {int(product['id']): product for product in response.json()}
+
+
+def _fetch_products(product_ids):
+    """
+    Fetches products by id, issuing the chunked batch lookups concurrently.
+    
+    Returns:
+        dict: Product data keyed by product id
+    """
+    chunks = [
+        product_ids[start:start + PRODUCTS_BATCH_SIZE]
+        for start in range(0, len(product_ids), PRODUCTS_BATCH_SIZE)
+    ]
+    if len(chunks) == 1:
+        return _fetch_products_chunk(chunks[0])
+
+    catalog = {}
+    # Pool threads do not inherit the request's span; bind it so the lookups join the trace
+    for chunk_catalog in _products_lookup_pool.map(bind_context(_fetch_products_chunk), chunks):
+        catalog.update(chunk_catalog)
+    return catalog
 
 @order_controller.route('/api/orders', methods=['GET'])
 def get_orders():
-    print("listado de ordenes")
+    log_event(logger, logging.DEBUG, 'listado de ordenes')
     
-    orders = Orders.query.all()
-    result = []
-    for order in orders:
-        result.append({
-            'id': order.id, 
-            'userName': order.userName, 
-            'userEmail': order.userEmail, 
-            'saleTotal': float(order.saleTotal) if order.saleTotal else None,
-            'date': order.date.isoformat() if order.date else None
-        })
-    return jsonify(result)
+    try:
+        query = _filtered_orders_query()
+    except ValueError as e:
+        return jsonify({'message': f'Filtro invalido: {str(e)}'}), 400
+
+    if wants_unpaginated():
+        etag, last_modified = collection_validators(query, Orders.updatedAt, Orders.id)
+        return conditional_json(etag, last_modified, lambda: shape_rows([
+            _order_to_dict(order) for order in query.order_by(Orders.id).all()
+        ]))
+
+    try:
+        limit, after, descending = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': f'Parametros de paginacion invalidos: {str(e)}'}), 400
+
+    orders, next_cursor = keyset_page(query, Orders.id, limit, after, descending)
+
+    def build_page():
+        result = [_order_to_dict(order) for order in orders]
+        if _include_items():
+            items = _items_by_order([order.id for order in orders])
+            for order_dict in result:
+                order_dict['items'] = items.get(order_dict['id'], [])
+        return page_response(result, next_cursor, limit)
+
+    etag, last_modified = page_validators(orders, next_cursor, Orders.updatedAt, Orders.id)
+    return conditional_json(etag, last_modified, build_page)
+
+@order_controller.route('/api/orders/stats', methods=['GET'])
+def get_order_stats():
+    """
+    Ventas agregadas por dia (group=day) o por cliente (group=user) en
+    [from, to), leidas de las tablas de rollup en lugar de las ordenes.
+    group=day acepta userEmail; group=user acepta limit (top por ingresos).
+    """
+    log_event(logger, logging.DEBUG, 'estadisticas de ordenes')
+    group = request.args.get('group', 'day')
+    if group not in ('day', 'user'):
+        return jsonify({'message': 'group debe ser day o user'}), 400
+    try:
+        date_from, date_to = _stats_range()
+        limit = int(request.args.get('limit', STATS_DEFAULT_LIMIT))
+        if limit <= 0:
+            raise ValueError('limit debe ser mayor a 0')
+    except ValueError as e:
+        return jsonify({'message': f'Parametros invalidos: {str(e)}'}), 400
+
+    user_email = request.args.get('userEmail') or None
+    if group == 'day':
+        items = sales_by_day(date_from, date_to, user_email)
+    else:
+        user_email = None
+        items = sales_by_user(date_from, date_to, min(limit, STATS_MAX_LIMIT))
 
-@order_controller.route('/api/orders/<int:order_id>', methods=['GET'])
-def get_order(order_id):
-    print("obteniendo orden")
-    order = Orders.query.get_or_404(order_id)
     return jsonify({
+        'group': group,
+        'from': date_from.isoformat() if date_from else None,
+        'to': date_to.isoformat() if date_to else None,
+        'items': shape_rows(items),
+        'totals': sales_totals(date_from, date_to, user_email)
+    })
+
+@order_controller.route('/api/orders/stats/rebuild', methods=['POST'])
+def rebuild_order_stats():
+    """Recalcula los rollups de [from, to) (o de todo el historial) a partir de las ordenes"""
+    try:
+        date_from, date_to = _stats_range()
+    except ValueError as e:
+        return jsonify({'message': f'Parametros invalidos: {str(e)}'}), 400
+    log_event(logger, logging.INFO, 'reconstruyendo estadisticas', date_from=date_from, date_to=date_to)
+    try:
+        days = rebuild_rollups(date_from, date_to)
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 409, {'Retry-After': '5'}
+    return jsonify({'message': 'Estadisticas reconstruidas', 'days': days})
+
+def _stats_range():
+    """from/to query parameters as dates (to is exclusive), None when absent"""
+    bounds = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        bounds.append(datetime.fromisoformat(value.replace('Z', '+00:00')).date() if value else None)
+    return tuple(bounds)
+
+@order_controller.route('/api/orders/export', methods=['GET'])
+def export_orders():
+    log_event(logger, logging.DEBUG, 'exportando ordenes')
+    try:
+        query = _filtered_orders_query()
+    except ValueError as e:
+        return jsonify({'message': f'Filtro invalido: {str(e)}'}), 400
+    return stream_export(query.order_by(Orders.id), _order_to_dict, 'orders')
+
+def _filtered_orders_query():
+    """Builds the orders query with the userEmail and from/to date filters applied in SQL"""
+    query = Orders.query
+    user_email = request.args.get('userEmail')
+    if user_email:
+        query = query.filter(Orders.userEmail == user_email)
+    date_from = request.args.get('from')
+    if date_from:
+        query = query.filter(Orders.date >= datetime.fromisoformat(date_from.replace('Z', '+00:00')))
+    date_to = request.args.get('to')
+    if date_to:
+        query = query.filter(Orders.date < datetime.fromisoformat(date_to.replace('Z', '+00:00')))
+    return query
+
+def _order_to_dict(order):
+    return {
         'id': order.id, 
         'userName': order.userName, 
         'userEmail': order.userEmail, 
         'saleTotal': float(order.saleTotal) if order.saleTotal else None,
-        'date': order.date.isoformat() if order.date else None
-    })
+        'date': order.date.isoformat() if order.date else None,
+        'status': order.status
+    }
+
+@order_controller.route('/api/orders/<int:order_id>', methods=['GET'])
+def get_order(order_id):
+    log_event(logger, logging.DEBUG, 'obteniendo orden', order_id=order_id)
+    order = Orders.query.get_or_404(order_id)
+
+    def build():
+        result = _order_to_dict(order)
+        if _include_items():
+            result['items'] = _items_by_order([order.id]).get(order.id, [])
+        return result
+
+    etag, last_modified = resource_validators(order.id, order.updatedAt)
+    return conditional_json(etag, last_modified, build)
+
+def _include_items():
+    return 'items' in request.args.get('include', '').split(',')
+
+def _items_by_order(order_ids):
+    """Loads the line items of several orders with a single IN (...) query"""
+    items = {}
+    if not order_ids:
+        return items
+    rows = OrderItems.query.filter(OrderItems.order_id.in_(order_ids)).order_by(OrderItems.id).all()
+    for item in rows:
+        items.setdefault(item.order_id, []).append({
+            'productId': item.productId,
+            'name': item.name,
+            'quantity': item.quantity,
+            'price': float(item.price),
+            'subtotal': float(item.subtotal)
+        })
+    return items
 
 @order_controller.route('/api/orders', methods=['POST'])
 def create_order():
@@ -42,6 +239,8 @@ def create_order():
     Toma la información de usuario desde sesión.
     Calcula el total de la venta, verifica la disponibilidad de los productos y
     actualiza el inventario llamando al endpoint de actualización de productos.
+    Si se envía el header Idempotency-Key, los reintentos con la misma clave
+    devuelven la respuesta almacenada sin volver a llamar a microProducts.
     
     Args:
         None
@@ -50,11 +249,26 @@ def create_order():
         JSON: Un mensaje de confirmación si la orden se crea correctamente,
         o un mensaje de error con el código de estado HTTP apropiado.
     """
-    print("creando orden")
-    data = request.get_json()
+    log_event(logger, logging.DEBUG, 'creando orden')
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        return _create_order_idempotent(idempotency_key)
+
+    body, status = _create_order()
+    return jsonify(body), status
+
+
+def _create_order():
+    """
+    Validates the request and creates the order.
+    
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    data = request.get_json(silent=True)
     
     if not data:
-        return jsonify({'message': 'No se proporcionaron datos'}), 400
+        return {'message': 'No se proporcionaron datos'}, 400
     
     # Extract user information from session (prioritized) or fallback to request
     user_name = session.get('username')
@@ -72,12 +286,12 @@ def create_order():
     
     # Validate user information
     if not user_name or not user_email:
-        return jsonify({'message': 'Información de usuario inválida. Asegúrese de estar autenticado.'}), 400
+        return {'message': 'Información de usuario inválida. Asegúrese de estar autenticado.'}, 400
     
     # Extract and validate products - now required
     products = data.get('products')
     if not products or not isinstance(products, list):
-        return jsonify({'message': 'Falta o es inválida la información de los productos'}), 400
+        return {'message': 'Falta o es inválida la información de los productos'}, 400
     
     try:
         # Calculate total and validate product availability
@@ -88,14 +302,106 @@ def create_order():
             user_name, user_email, sale_total, processed_products, data
         )
         
-        return jsonify(order_result), 201
+        return order_result, 201
         
-    except ValueError as e:
-        return jsonify({'message': str(e)}), 400
     except requests.RequestException as e:
-        return jsonify({'message': f'Error de comunicación con microservicio: {str(e)}'}), 503
+        # Checked before ValueError: an unreadable upstream body (JSONDecodeError) is both
+        return {'message': f'Error de comunicación con microservicio: {str(e)}'}, 503
+    except ValueError as e:
+        return {'message': str(e)}, 400
     except Exception as e:
-        return jsonify({'message': f'Error inesperado al procesar la orden: {str(e)}'}), 500
+        return {'message': f'Error inesperado al procesar la orden: {str(e)}'}, 500
+
+
+def _create_order_idempotent(idempotency_key):
+    """
+    Runs _create_order at most once per Idempotency-Key.
+    
+    The key is claimed with an INSERT before any upstream call, so concurrent
+    duplicates collide on the primary key instead of reserving stock twice.
+    Keys belong to the user sending them: the same key from two users names
+    two different requests.
+    
+    Returns:
+        Response: The new or replayed response
+    """
+    if len(idempotency_key) > 255:
+        return jsonify({'message': 'Idempotency-Key demasiado largo'}), 400
+
+    idempotency_key = _scoped_idempotency_key(idempotency_key)
+    request_hash = hashlib.sha256(request.get_data()).hexdigest()
+    replay = _claim_idempotency_key(idempotency_key, request_hash)
+    if replay is not None:
+        return replay
+
+    body, status = _create_order()
+
+    if status >= 500:
+        # Transient or upstream failure (503): not an outcome of the request
+        # itself, so the key is released and the client can retry
+        IdempotencyKeys.query.filter_by(key=idempotency_key).delete(synchronize_session=False)
+    else:
+        IdempotencyKeys.query.filter_by(key=idempotency_key).update({
+            'status': 'completed',
+            'responseCode': status,
+            'responseBody': json.dumps(body)
+        }, synchronize_session=False)
+    db.session.commit()
+
+    return jsonify(body), status
+
+
+def _scoped_idempotency_key(idempotency_key):
+    """
+    Stored key for the client's Idempotency-Key, namespaced by its owner:
+    the session user or, for unauthenticated calls, the email in the body.
+    """
+    owner = session.get('email')
+    if not owner:
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        user = data.get('user') if isinstance(data.get('user'), dict) else {}
+        owner = f"anonymous:{user.get('email') or data.get('userEmail') or ''}"
+    return hashlib.sha256(f'{owner}\n{idempotency_key}'.encode('utf-8')).hexdigest()
+
+
+def _claim_idempotency_key(idempotency_key, request_hash, retry=True):
+    """
+    Claims the key for this request.
+    
+    Returns:
+        None if the caller now owns the key, otherwise the response to send
+    """
+    try:
+        db.session.add(IdempotencyKeys(idempotency_key, request_hash))
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = db.session.get(IdempotencyKeys, idempotency_key)
+    if existing is None:
+        if retry:
+            return _claim_idempotency_key(idempotency_key, request_hash, retry=False)
+        return jsonify({'message': 'Solicitud con la misma Idempotency-Key en curso'}), 409, {'Retry-After': '1'}
+
+    age = datetime.utcnow() - existing.createdAt
+    expired = age > IDEMPOTENCY_TTL or (existing.status == 'in_progress' and age > IDEMPOTENCY_LOCK_TIMEOUT)
+    if expired and retry:
+        # Conditional delete so only one of several concurrent takers wins
+        IdempotencyKeys.query.filter_by(
+            key=idempotency_key, createdAt=existing.createdAt
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return _claim_idempotency_key(idempotency_key, request_hash, retry=False)
+
+    if existing.requestHash != request_hash:
+        return jsonify({'message': 'Idempotency-Key reutilizada con una solicitud diferente'}), 422
+
+    if existing.status != 'completed':
+        return jsonify({'message': 'Solicitud con la misma Idempotency-Key en curso'}), 409, {'Retry-After': '1'}
+
+    return jsonify(json.loads(existing.responseBody)), existing.responseCode, {'Idempotent-Replayed': 'true'}
 
 
 
@@ -115,22 +421,32 @@ def _calculate_order_total(products):
     """
     sale_total = 0
     processed_products = []
-    
+
+    # Normalize line items before hitting the products service
+    line_items = []
     for product_item in products:
         product_id = product_item.get('id')
         quantity = int(product_item.get('quantity', 0))
-        
+
         if not product_id or quantity <= 0:
             continue
-        
-        # Fetch current product data from products microservice
-        response = requests.get(f'http://192.168.80.3:5003/api/products/{product_id}')
-        if response.status_code != 200:
+
+        line_items.append((int(product_id), quantity))
+
+    if not line_items:
+        raise ValueError('No hay productos válidos en la orden')
+
+    # Fetch the whole cart with batch lookups (one request unless the cart is very large)
+    product_ids = sorted({product_id for product_id, _ in line_items})
+    catalog = _fetch_products(product_ids)
+
+    for product_id, quantity in line_items:
+        product_data = catalog.get(product_id)
+        if product_data is None:
             raise ValueError(f'Producto con ID {product_id} no encontrado')
-        
-        product_data = response.json()
-        current_stock = int(product_data.get('quantity', 0))
-        price = float(product_data.get('price', 0))
+
+        current_stock = int(product_data.get('quantity') or 0)
+        price = float(product_data.get('price') or 0)
         product_name = product_data.get('name', f'Producto {product_id}')
         
         # Validate stock availability
@@ -162,7 +478,9 @@ def _calculate_order_total(products):
 
 def _process_order_transaction(user_name, user_email, sale_total, processed_products, data):
     """
-    Processes order transaction: updates inventory and creates order.
+    Processes order transaction: creates the order, its items and the stock
+    reservation outbox event in a single local commit. The relay in
+    orders/outbox.py reserves the stock and confirms or rejects the order.
     
     Args:
         user_name: Customer name
@@ -172,30 +490,12 @@ def _process_order_transaction(user_name, user_email, sale_total, processed_prod
         data: Original request data
         
     Returns:
-        dict: Order creation result
+        dict: Order creation result (status pending)
         
     Raises:
         Exception: If transaction fails
     """
     try:
-        # Update inventory for each product
-        for product in processed_products:
-            new_stock = product['current_stock'] - product['quantity']
-            
-            # Call products microservice to update inventory
-            update_response = requests.put(
-                f'http://192.168.80.3:5003/api/products/{product["id"]}',
-                json={
-                    'name': product['name'],
-                    'price': product['price'],
-                    'quantity': new_stock
-                },
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            if update_response.status_code != 200:
-                raise Exception(f'Error al actualizar inventario del producto {product["name"]}')
-        
         # Create the order record
         date_obj = datetime.utcnow()
         if 'date' in data and data['date']:
@@ -212,7 +512,23 @@ def _process_order_transaction(user_name, user_email, sale_total, processed_prod
         )
         
         db.session.add(new_order)
+        db.session.flush()
+
+        # Persist the per-product breakdown with one bulk insert in the same transaction
+        db.session.bulk_insert_mappings(OrderItems, [
+            {
+                'order_id': new_order.id,
+                'productId': p['id'],
+                'name': p['name'],
+                'quantity': p['quantity'],
+                'price': p['price'],
+                'subtotal': p['subtotal']
+            } for p in processed_products
+        ])
+        enqueue_stock_reservation(new_order.id, processed_products)
+        record_sale(new_order)
         db.session.commit()
+        notify_relay()
         
         # Prepare detailed response
         return {
@@ -223,6 +539,7 @@ def _process_order_transaction(user_name, user_email, sale_total, processed_prod
                 'userEmail': user_email,
                 'products': [
                     {
+                        'id': p['id'],
                         'name': p['name'],
                         'quantity': p['quantity'],
                         'price': p['price'],
@@ -230,7 +547,8 @@ def _process_order_transaction(user_name, user_email, sale_total, processed_prod
                     } for p in processed_products
                 ],
                 'saleTotal': sale_total,
-                'date': date_obj.isoformat()
+                'date': date_obj.isoformat(),
+                'status': new_order.status
             }
         }
         
@@ -238,16 +556,32 @@ def _process_order_transaction(user_name, user_email, sale_total, processed_prod
         db.session.rollback()
         raise Exception(f'Error al procesar la orden: {str(e)}')
 
+def _locked_order_or_404(order_id):
+    """
+    Loads the order with its row locked until commit. Its rollup delta is
+    computed from this read, so the outbox relay rejecting or failing the
+    same order concurrently waits instead of subtracting the sale twice.
+    """
+    order = Orders.query.filter_by(id=order_id).with_for_update().populate_existing().first()
+    if order is None:
+        abort(404)
+    return order
+
 @order_controller.route('/api/orders/<int:order_id>', methods=['PUT'])
 def update_order(order_id):
-    print("actualizando orden")
-    order = Orders.query.get_or_404(order_id)
+    log_event(logger, logging.DEBUG, 'actualizando orden', order_id=order_id)
+    order = _locked_order_or_404(order_id)
     data = request.json
+    before = snapshot_sale(order)
     
     # Handle missing fields gracefully
     order.userName = data.get('userName', order.userName)
     order.userEmail = data.get('userEmail', order.userEmail)
-    order.saleTotal = data.get('saleTotal', order.saleTotal)
+    if 'saleTotal' in data:
+        try:
+            order.saleTotal = to_money(data['saleTotal'])
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
     
     if 'date' in data and data['date']:
         try:
@@ -255,13 +589,20 @@ def update_order(order_id):
         except:
             pass
     
+    record_sale_change(order, before)
     db.session.commit()
     return jsonify({'message': 'Order updated successfully'})
 
 @order_controller.route('/api/orders/<int:order_id>', methods=['DELETE'])
 def delete_order(order_id):
-    print("eliminando orden")
-    order = Orders.query.get_or_404(order_id)
+    log_event(logger, logging.DEBUG, 'eliminando orden', order_id=order_id)
+    # Same lock order as the outbox relay (events, then the order) so the two cannot deadlock
+    OutboxEvents.query.filter_by(aggregateId=order_id).with_for_update().all()
+    order = _locked_order_or_404(order_id)
+    OrderItems.query.filter_by(order_id=order_id).delete(synchronize_session=False)
+    # A reservation not yet delivered must not be sent for a deleted order
+    OutboxEvents.query.filter_by(aggregateId=order_id, status='pending').delete(synchronize_session=False)
+    record_sale(order, sign=-1)
     db.session.delete(order)
     db.session.commit()
     return jsonify({'message': 'Order deleted successfully'})
\ No newline at end of file
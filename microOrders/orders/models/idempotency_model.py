@@ -0,0 +1,18 @@
+from db.db import db
+from datetime import datetime
+
+class IdempotencyKeys(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    key = db.Column(db.String(255), primary_key=True)
+    requestHash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='in_progress')
+    responseCode = db.Column(db.Integer, nullable=True)
+    responseBody = db.Column(db.Text, nullable=True)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, key, requestHash):
+        self.key = key
+        self.requestHash = requestHash
+        self.status = 'in_progress'
+        self.createdAt = datetime.utcnow()
@@ -0,0 +1,20 @@
+from db.db import db
+
+class OrderItems(db.Model):
+    __tablename__ = 'order_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True)
+    productId = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(255), nullable=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    subtotal = db.Column(db.Numeric(10, 2), nullable=False)
+
+    def __init__(self, order_id, productId, name, quantity, price, subtotal):
+        self.order_id = order_id
+        self.productId = productId
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.subtotal = subtotal
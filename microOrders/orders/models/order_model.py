@@ -1,12 +1,23 @@
 from db.db import db
 from datetime import datetime
+from sqlalchemy.dialects import mysql
 
 class Orders(db.Model):
+    # Created by migrations/0005_orders_lookup_indexes.py
+    __table_args__ = (
+        db.Index('ix_orders_userEmail_date', 'userEmail', 'date'),
+        db.Index('ix_orders_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     userName = db.Column(db.String(255), nullable=True)
     userEmail = db.Column(db.String(255), nullable=True)
     saleTotal = db.Column(db.Numeric(10, 2), nullable=True)
     date = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    updatedAt = db.Column(db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql'), nullable=True,
+                          default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # pending until microProducts confirms or rejects the stock reservation (see orders/outbox.py)
+    status = db.Column(db.String(20), nullable=False, default='pending')
 
     def __init__(self, userName, userEmail, saleTotal, date=None):
         self.userName = userName
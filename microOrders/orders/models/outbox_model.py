@@ -0,0 +1,28 @@
+from db.db import db
+from datetime import datetime
+
+class OutboxEvents(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        db.Index('ix_outbox_events_status_nextAttemptAt', 'status', 'nextAttemptAt'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    eventType = db.Column(db.String(64), nullable=False)
+    aggregateId = db.Column(db.Integer, nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lastError = db.Column(db.String(255), nullable=True)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    nextAttemptAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    deliveredAt = db.Column(db.DateTime, nullable=True)
+
+    def __init__(self, eventType, aggregateId, payload):
+        self.eventType = eventType
+        self.aggregateId = aggregateId
+        self.payload = payload
+        self.status = 'pending'
+        self.attempts = 0
+        self.createdAt = datetime.utcnow()
+        self.nextAttemptAt = self.createdAt
@@ -0,0 +1,43 @@
+from db.db import db
+from datetime import datetime
+
+# Created by migrations/0007_create_sales_rollups.py; maintained by orders/rollups.py
+
+class SalesDeltas(db.Model):
+    """Pending changes to the rollups, written in the same transaction as the order"""
+    __tablename__ = 'sales_deltas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    userEmail = db.Column(db.String(255), nullable=False)
+    userName = db.Column(db.String(255), nullable=True)
+    orders = db.Column(db.Integer, nullable=False)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, day, userEmail, userName, orders, revenue):
+        self.day = day
+        self.userEmail = userEmail
+        self.userName = userName
+        self.orders = orders
+        self.revenue = revenue
+        self.createdAt = datetime.utcnow()
+
+
+class SalesDaily(db.Model):
+    __tablename__ = 'sales_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+
+class SalesUserDaily(db.Model):
+    __tablename__ = 'sales_user_daily'
+
+    # Day first: dashboards filter on a date range, then group by customer
+    day = db.Column(db.Date, primary_key=True)
+    userEmail = db.Column(db.String(255), primary_key=True)
+    userName = db.Column(db.String(255), nullable=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
@@ -0,0 +1,185 @@
+"""
+Transactional outbox for microOrders.
+Stock reservations are written as outbox events in the same transaction as
+the order and delivered to microProducts in batches by a background relay.
+Delivery is at-least-once; microProducts deduplicates by reservationId.
+Events still undelivered after OUTBOX_MAX_ATTEMPTS are given up on and
+their orders marked 'failed'.
+"""
+import os
+import json
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from db.db import db
+from orders.models.order_model import Orders
+from orders.models.outbox_model import OutboxEvents
+from orders.products_client import products_client
+from orders.rollups import NOT_SALE_STATUSES, record_sale
+from shared.metrics import REGISTRY, Counter
+from shared.tracing import span
+
+logger = logging.getLogger(__name__)
+
+STOCK_RESERVATION_EVENT = 'stock.reserve'
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '20'))
+
+outbox_events_failed = REGISTRY.register(Counter(
+    'outbox_events_failed_total', 'Outbox events given up on after OUTBOX_MAX_ATTEMPTS', ('event',)))
+
+_wakeup = threading.Event()
+_relay_thread = None
+_relay_lock = threading.Lock()
+
+
+def reservation_id(order_id):
+    return f'order-{order_id}'
+
+
+def enqueue_stock_reservation(order_id, processed_products):
+    """Adds the stock reservation event for an order to the current session (caller commits)"""
+    payload = {
+        'reservationId': reservation_id(order_id),
+        'items': [{'id': p['id'], 'quantity': p['quantity']} for p in processed_products]
+    }
+    db.session.add(OutboxEvents(STOCK_RESERVATION_EVENT, order_id, json.dumps(payload)))
+
+
+def notify_relay():
+    """Wakes the relay up right after a commit instead of waiting for the next poll"""
+    _wakeup.set()
+
+
+def _retry_at(attempts):
+    # Exponential backoff with jitter, capped at 5 minutes
+    delay = min(300, 2 ** attempts) * random.uniform(0.5, 1.0)
+    return datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _record_attempt(event, error, failed):
+    """Schedules the next attempt, or gives up and adds the order to failed"""
+    event.attempts += 1
+    if error is not None:
+        event.lastError = error[:255]
+    if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+        event.status = 'failed'
+        failed.append(event.aggregateId)
+        outbox_events_failed.inc(event.eventType)
+        logger.error(f"Outbox event {event.id} ({event.eventType}) failed after {event.attempts} attempts: {event.lastError}")
+    else:
+        event.nextAttemptAt = _retry_at(event.attempts)
+
+
+def _end_sales(order_ids, status):
+    """Moves orders to a terminal status that is not a sale (rejected, failed), out of the rollups"""
+    if not order_ids:
+        return
+    # Locked and re-read: an update or delete of the same order running now
+    # either finished first (seen here) or waits, so the sale is subtracted once
+    orders = Orders.query.filter(Orders.id.in_(order_ids)).with_for_update().populate_existing().all()
+    for order in orders:
+        if order.status in NOT_SALE_STATUSES:
+            continue
+        record_sale(order, sign=-1)
+        order.status = status
+
+
+def relay_once(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Delivers one batch of pending events.
+    
+    Returns:
+        int: Number of events delivered
+    """
+    events = (
+        OutboxEvents.query
+        .filter(OutboxEvents.status == 'pending', OutboxEvents.nextAttemptAt <= datetime.utcnow())
+        .order_by(OutboxEvents.id)
+        .limit(batch_size)
+        # Several workers may run a relay; each claims a disjoint batch
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not events:
+        db.session.rollback()
+        return 0
+
+    # Idle polls are not traced; each delivered batch is its own trace
+    with span('outbox.relay', events=len(events)):
+        return _deliver(events)
+
+
+def _deliver(events):
+    payloads = {event.id: json.loads(event.payload) for event in events}
+    try:
+        response = products_client().post(
+            '/api/products/reservations/batch',
+            json={'reservations': list(payloads.values())}
+        )
+        if response.status_code != 200:
+            raise requests.RequestException(f'HTTP {response.status_code}')
+        results = {result['reservationId']: result for result in response.json()['results']}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning(f"Outbox delivery of {len(events)} event(s) failed: {e}")
+        failed = []
+        for event in events:
+            _record_attempt(event, str(e), failed)
+        _end_sales(failed, 'failed')
+        db.session.commit()
+        return 0
+
+    confirmed, rejected, failed = [], [], []
+    delivered = 0
+    now = datetime.utcnow()
+    for event in events:
+        result = results.get(payloads[event.id]['reservationId'])
+        status = result.get('status') if result else None
+        if status is None or status >= 500:
+            # Not processed (e.g. the same reservation in flight elsewhere); try again later
+            _record_attempt(event, (result or {}).get('message') or 'not processed', failed)
+            continue
+        (confirmed if status == 200 else rejected).append(event.aggregateId)
+        event.status = 'delivered'
+        event.deliveredAt = now
+        event.lastError = None if status == 200 else (result.get('message') or '')[:255]
+        delivered += 1
+
+    if confirmed:
+        Orders.query.filter(Orders.id.in_(confirmed)).update({'status': 'confirmed'}, synchronize_session=False)
+    # Rejected and failed orders are not sales: take them out of the rollups in the same commit
+    _end_sales(rejected, 'rejected')
+    _end_sales(failed, 'failed')
+    db.session.commit()
+    return delivered
+
+
+def _relay_loop(app):
+    while True:
+        delivered = 0
+        try:
+            with app.app_context():
+                delivered = relay_once()
+        except Exception as e:
+            logger.error(f"Outbox relay error: {e}")
+        if delivered < OUTBOX_BATCH_SIZE:
+            # Nothing (or not a full batch) left: sleep until the next poll or a new order
+            _wakeup.wait(OUTBOX_POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def start_outbox_relay(app):
+    """Starts the background relay thread once per process"""
+    global _relay_thread
+    if os.getenv('OUTBOX_RELAY_ENABLED', 'true').lower() != 'true':
+        return
+    with _relay_lock:
+        if _relay_thread is None or not _relay_thread.is_alive():
+            _relay_thread = threading.Thread(target=_relay_loop, args=(app,), name='outbox-relay', daemon=True)
+            _relay_thread.start()
+            logger.info(f"Outbox relay started in process {os.getpid()}")
@@ -0,0 +1,11 @@
+import os
+from shared.http_client import get_service_client
+
+PRODUCTS_SERVICE_NAME = os.getenv('PRODUCTS_SERVICE_NAME', 'microproducts')
+# Used only while Consul has no healthy microproducts instance
+PRODUCTS_FALLBACK_URL = os.getenv('PRODUCTS_SERVICE_URL', 'http://microproducts:5003')
+
+
+def products_client():
+    """Pooled, load-balanced HTTP client for the products microservice"""
+    return get_service_client(PRODUCTS_SERVICE_NAME, PRODUCTS_FALLBACK_URL)
@@ -0,0 +1,357 @@
+"""
+Sales rollups for microOrders reporting.
+Order writes append signed deltas (orders, revenue per day and customer) in
+their own transaction; no shared counter row is locked on the checkout path.
+A background compactor folds the deltas into sales_daily and
+sales_user_daily, and reads add whatever has not been folded yet, so stats
+are exact at any moment while scanning one row per day (or customer-day).
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import sqlalchemy as sa
+from db.db import db
+from orders.models.order_model import Orders
+from orders.models.sales_rollup_model import SalesDaily, SalesDeltas, SalesUserDaily
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COMPACTION_BATCH = int(os.getenv('ROLLUP_COMPACTION_BATCH', '1000'))
+ROLLUP_COMPACTION_INTERVAL = float(os.getenv('ROLLUP_COMPACTION_INTERVAL', '5'))
+ROLLUP_LOCK_TIMEOUT = int(os.getenv('ROLLUP_LOCK_TIMEOUT', '30'))
+
+# Orders that never became sales: stock rejected, or reservation given up on
+NOT_SALE_STATUSES = ('rejected', 'failed')
+
+_compactor_thread = None
+_compactor_lock = threading.Lock()
+
+
+def to_money(value) -> Decimal:
+    """
+    Decimal with two places for a sale total.
+
+    Raises:
+        ValueError: If value is not a number
+    """
+    try:
+        amount = Decimal(str(value if value is not None else 0))
+        # NaN and Infinity parse fine but cannot be stored or summed
+        if not amount.is_finite():
+            raise InvalidOperation
+        return amount.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'Monto invalido: {value}')
+
+
+def _is_sale(order) -> bool:
+    # Pending orders count until they are rejected or fail
+    return order.date is not None and order.status not in NOT_SALE_STATUSES
+
+
+def _sale_key(order):
+    return order.date.date(), order.userEmail or '', order.userName
+
+
+def record_sale(order, sign=1):
+    """Adds (sign=1) or removes (sign=-1) order from the rollups in the current session (caller commits)"""
+    if not _is_sale(order):
+        return
+    day, user_email, user_name = _sale_key(order)
+    db.session.add(SalesDeltas(day, user_email, user_name, sign, sign * to_money(order.saleTotal)))
+
+
+def snapshot_sale(order):
+    """Values of order that the rollups depend on, taken before it is modified (None if not a sale)"""
+    if not _is_sale(order):
+        return None
+    return _sale_key(order), to_money(order.saleTotal)
+
+
+def record_sale_change(order, before):
+    """Moves order in the rollups from its snapshot_sale() values to its current ones"""
+    if snapshot_sale(order) == before:
+        return
+    if before is not None:
+        (day, user_email, user_name), total = before
+        db.session.add(SalesDeltas(day, user_email, user_name, -1, -total))
+    record_sale(order)
+
+
+@contextmanager
+def _rollup_lock(timeout: int):
+    """
+    Serializes compaction and rebuilds across workers (MySQL named lock).
+
+    Yields:
+        bool: Whether the lock was acquired
+
+    The lock lives on its own connection, not the session's, so callers
+    commit inside the block and the lock is only released once their writes
+    are visible to the next holder.
+    """
+    if db.engine.dialect.name != 'mysql':
+        yield True
+        return
+    with db.engine.connect() as conn:
+        acquired = conn.execute(sa.text('SELECT GET_LOCK(:name, :timeout)'),
+                                {'name': 'sales_rollups', 'timeout': timeout}).scalar() == 1
+        try:
+            yield acquired
+        except BaseException:
+            # Undo uncommitted writes before another holder can take the lock
+            db.session.rollback()
+            raise
+        finally:
+            if acquired:
+                conn.execute(sa.text('SELECT RELEASE_LOCK(:name)'), {'name': 'sales_rollups'})
+
+
+def _upsert_increments(model, rows, key_columns):
+    """INSERT ... ON DUPLICATE KEY UPDATE value = value + new for each row"""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.session.connection().dialect.name
+    # Sorted keys give every compactor the same lock order
+    rows = sorted(rows, key=lambda row: tuple(row[column] for column in key_columns))
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        new = statement.inserted
+        updates = {'orders': table.c.orders + new.orders, 'revenue': table.c.revenue + new.revenue}
+        if 'userName' in table.c:
+            updates['userName'] = sa.func.coalesce(new.userName, table.c.userName)
+        statement = statement.on_duplicate_key_update(**updates)
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(rows)
+        new = statement.excluded
+        updates = {'orders': table.c.orders + new.orders, 'revenue': table.c.revenue + new.revenue}
+        if 'userName' in table.c:
+            updates['userName'] = sa.func.coalesce(new.userName, table.c.userName)
+        statement = statement.on_conflict_do_update(index_elements=key_columns, set_=updates)
+    db.session.execute(statement)
+
+
+def compact_once(batch_size=ROLLUP_COMPACTION_BATCH):
+    """
+    Folds one batch of deltas into the rollup tables.
+
+    Returns:
+        int: Number of deltas folded
+    """
+    with _rollup_lock(0) as acquired:
+        folded = _fold_deltas(batch_size) if acquired else 0
+        if folded:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    return folded
+
+
+def _fold_deltas(batch_size):
+    deltas = (
+        SalesDeltas.query
+        .order_by(SalesDeltas.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not deltas:
+        return 0
+
+    daily, per_user = {}, {}
+    for delta in deltas:
+        row = daily.setdefault(delta.day, {'day': delta.day, 'orders': 0, 'revenue': Decimal('0')})
+        row['orders'] += delta.orders
+        row['revenue'] += delta.revenue
+        row = per_user.setdefault((delta.day, delta.userEmail), {
+            'day': delta.day, 'userEmail': delta.userEmail, 'userName': None,
+            'orders': 0, 'revenue': Decimal('0')
+        })
+        row['orders'] += delta.orders
+        row['revenue'] += delta.revenue
+        # Deltas come in id order, so the most recent name wins
+        row['userName'] = delta.userName or row['userName']
+
+    _upsert_increments(SalesDaily, list(daily.values()), ['day'])
+    _upsert_increments(SalesUserDaily, list(per_user.values()), ['day', 'userEmail'])
+    SalesDeltas.query.filter(
+        SalesDeltas.id.in_([delta.id for delta in deltas])
+    ).delete(synchronize_session=False)
+    db.session.flush()
+    return len(deltas)
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Recomputes the rollups of [date_from, date_to) from the orders table.
+
+    Deltas not yet folded are subtracted from what is written, since the
+    compactor will still add them, so the rebuild is safe under live traffic.
+
+    Returns:
+        int: Number of days rebuilt
+    """
+    with _rollup_lock(ROLLUP_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            db.session.rollback()
+            raise RuntimeError('Otra compactacion o reconstruccion esta en curso')
+        days = _rebuild(date_from, date_to)
+        db.session.commit()
+    return days
+
+
+def _rebuild(date_from, date_to):
+    day = sa.func.date(Orders.date)
+    counted = [Orders.date.isnot(None), sa.or_(Orders.status.is_(None), Orders.status.notin_(NOT_SALE_STATUSES))]
+    if date_from is not None:
+        counted.append(Orders.date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        counted.append(Orders.date < datetime.combine(date_to, datetime.min.time()))
+    user_email = sa.func.coalesce(Orders.userEmail, '')
+
+    per_user = {}
+    query = db.session.query(
+        day, user_email, sa.func.max(Orders.userName), sa.func.count(), sa.func.sum(Orders.saleTotal)
+    ).filter(*counted).group_by(day, user_email)
+    for row_day, row_email, row_name, count, total in query:
+        row_day = _as_date(row_day)
+        per_user[(row_day, row_email)] = {
+            'day': row_day, 'userEmail': row_email, 'userName': row_name,
+            'orders': count, 'revenue': to_money(total)
+        }
+    # Pending deltas (same snapshot) will still be folded in by the compactor
+    for delta in SalesDeltas.query.filter(*_day_range(SalesDeltas.day, date_from, date_to)):
+        row = per_user.setdefault((delta.day, delta.userEmail), {
+            'day': delta.day, 'userEmail': delta.userEmail, 'userName': delta.userName,
+            'orders': 0, 'revenue': Decimal('0')
+        })
+        row['orders'] -= delta.orders
+        row['revenue'] -= delta.revenue
+
+    daily = {}
+    for row in per_user.values():
+        total = daily.setdefault(row['day'], {'day': row['day'], 'orders': 0, 'revenue': Decimal('0')})
+        total['orders'] += row['orders']
+        total['revenue'] += row['revenue']
+
+    SalesDaily.query.filter(*_day_range(SalesDaily.day, date_from, date_to)).delete(synchronize_session=False)
+    SalesUserDaily.query.filter(*_day_range(SalesUserDaily.day, date_from, date_to)).delete(synchronize_session=False)
+    if daily:
+        db.session.execute(sa.insert(SalesDaily.__table__), list(daily.values()))
+        db.session.execute(sa.insert(SalesUserDaily.__table__), list(per_user.values()))
+    db.session.flush()
+    return len(daily)
+
+
+def _as_date(value) -> date:
+    # DATE() comes back as a string on SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _day_range(column, date_from, date_to):
+    conditions = []
+    if date_from is not None:
+        conditions.append(column >= date_from)
+    if date_to is not None:
+        conditions.append(column < date_to)
+    return conditions
+
+
+def _with_pending(rollup_columns, delta_columns, date_from, date_to, rollup_model, user_email=None):
+    """Rollup rows plus not yet folded deltas of the range, as one subquery"""
+    rollup = sa.select(*rollup_columns).where(*_day_range(rollup_model.day, date_from, date_to))
+    pending = sa.select(*delta_columns).where(*_day_range(SalesDeltas.day, date_from, date_to))
+    if user_email is not None:
+        rollup = rollup.where(rollup_model.userEmail == user_email)
+        pending = pending.where(SalesDeltas.userEmail == user_email)
+    return sa.union_all(rollup, pending).subquery()
+
+
+def sales_by_day(date_from=None, date_to=None, user_email=None):
+    """[{'day', 'orders', 'revenue'}] for each day of the range that had sales"""
+    model = SalesUserDaily if user_email is not None else SalesDaily
+    rows = _with_pending(
+        [model.day, model.orders, model.revenue],
+        [SalesDeltas.day, SalesDeltas.orders, SalesDeltas.revenue],
+        date_from, date_to, model, user_email
+    )
+    query = (
+        sa.select(rows.c.day, sa.func.sum(rows.c.orders), sa.func.sum(rows.c.revenue))
+        .group_by(rows.c.day)
+        .having(sa.func.sum(rows.c.orders) != 0)
+        .order_by(rows.c.day)
+    )
+    return [
+        {'day': _as_date(day).isoformat(), 'orders': int(orders), 'revenue': float(to_money(revenue))}
+        for day, orders, revenue in db.session.execute(query)
+    ]
+
+
+def sales_by_user(date_from=None, date_to=None, limit=100):
+    """[{'userEmail', 'userName', 'orders', 'revenue'}] for the top customers of the range by revenue"""
+    rows = _with_pending(
+        [SalesUserDaily.userEmail, SalesUserDaily.userName, SalesUserDaily.orders, SalesUserDaily.revenue],
+        [SalesDeltas.userEmail, SalesDeltas.userName, SalesDeltas.orders, SalesDeltas.revenue],
+        date_from, date_to, SalesUserDaily
+    )
+    revenue = sa.func.sum(rows.c.revenue)
+    query = (
+        sa.select(rows.c.userEmail, sa.func.max(rows.c.userName), sa.func.sum(rows.c.orders), revenue)
+        .group_by(rows.c.userEmail)
+        .having(sa.func.sum(rows.c.orders) != 0)
+        .order_by(revenue.desc(), rows.c.userEmail)
+        .limit(limit)
+    )
+    return [
+        {'userEmail': email, 'userName': name, 'orders': int(orders), 'revenue': float(to_money(total))}
+        for email, name, orders, total in db.session.execute(query)
+    ]
+
+
+def sales_totals(date_from=None, date_to=None, user_email=None):
+    model = SalesUserDaily if user_email is not None else SalesDaily
+    rows = _with_pending(
+        [model.orders, model.revenue], [SalesDeltas.orders, SalesDeltas.revenue],
+        date_from, date_to, model, user_email
+    )
+    orders, revenue = db.session.execute(
+        sa.select(sa.func.sum(rows.c.orders), sa.func.sum(rows.c.revenue))
+    ).one()
+    return {'orders': int(orders or 0), 'revenue': float(to_money(revenue))}
+
+
+def _compactor_loop(app):
+    while True:
+        folded = 0
+        try:
+            with app.app_context():
+                folded = compact_once()
+        except Exception as e:
+            logger.error(f"Sales rollup compaction error: {e}")
+        if folded < ROLLUP_COMPACTION_BATCH:
+            time.sleep(ROLLUP_COMPACTION_INTERVAL)
+
+
+def start_rollup_compactor(app):
+    """Starts the background compaction thread once per process"""
+    global _compactor_thread
+    if os.getenv('ROLLUP_COMPACTION_ENABLED', 'true').lower() != 'true':
+        return
+    with _compactor_lock:
+        if _compactor_thread is None or not _compactor_thread.is_alive():
+            _compactor_thread = threading.Thread(
+                target=_compactor_loop, args=(app,), name='sales-rollup-compactor', daemon=True
+            )
+            _compactor_thread.start()
+            logger.info(f"Sales rollup compactor started in process {os.getpid()}")
@@ -5,14 +5,24 @@ from flask_cors import CORS
 import os
 import logging
 from shared.consul_utils import register_service_with_consul
+from shared.database import pool_stats
+from shared.log import configure_logging
+from shared.metrics import init_metrics
+from shared.tracing import init_tracing
+from shared.responses import init_responses
+from shared.sessions import server_session_interface
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(os.getenv('SERVICE_NAME', 'microorders'))
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.secret_key = 'secret123'
+# Sessions live server-side and are shared with the other services through the store
+app.session_interface = server_session_interface()
 app.config.from_object('config.Config')
 db.init_app(app)
+init_metrics(app, db)
+init_tracing(app, os.getenv('SERVICE_NAME', 'microorders'), db)
+init_responses(app)
 
 # Registrando el blueprint del controlador de ordenes
 app.register_blueprint(order_controller)
@@ -29,5 +39,10 @@ def health_check():
         logger.error(f"Health check failed: {e}")
         return jsonify({"status": "unhealthy", "service": "microorders", "error": str(e)}), 500
 
+@app.route('/pool/stats')
+def get_pool_stats():
+    """Connection pool statistics for every database bind"""
+    return jsonify(pool_stats(db)), 200
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,11 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    create_table(conn, sa.Table(
+        'products', sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('name', sa.String(255)),
+        sa.Column('price', sa.Integer),
+        sa.Column('quantity', sa.Integer),
+    ))
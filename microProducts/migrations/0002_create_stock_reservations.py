@@ -0,0 +1,11 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    create_table(conn, sa.Table(
+        'stock_reservations', sa.MetaData(),
+        sa.Column('reservationId', sa.String(64), primary_key=True),
+        sa.Column('statusCode', sa.Integer, nullable=False),
+        sa.Column('message', sa.String(255)),
+        sa.Column('createdAt', sa.DateTime, nullable=False),
+    ))
@@ -1,26 +1,91 @@
 from flask import Blueprint, request, jsonify, session, g
 from products.models.product_model import Products
+from products.models.reservation_model import StockReservations
 from db.db import db
+import logging
+from shared.log import log_event
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from shared.pagination import wants_unpaginated, parse_page_args, keyset_page, escape_like, page_response
+from shared.streaming import stream_export
+from shared.responses import shape_rows
+from shared.cache import ResponseCache, cached_json_response
+from shared.bulk import iter_bulk_rows, bulk_write, bulk_chunk_size, parse_row_id
 
 product_controller = Blueprint('product_controller', __name__)
+logger = logging.getLogger(__name__)
+
+# Catalog reads go through this cache; every write path must invalidate it
+product_cache = ResponseCache('products')
 
 @product_controller.route('/api/products', methods=['GET'])
 def get_products():
-    print("listado de productos")
-    
-    products = Products.query.all()
-    result = [{'id': product.id, 'name': product.name, 'price': product.price, 'quantity': product.quantity} for product in products]
-    return jsonify(result)
+    log_event(logger, logging.DEBUG, 'listado de productos')
+
+    # Consulta por lotes: /api/products?ids=1,2,3 resuelve todo en un solo IN (...)
+    ids_param = request.args.get('ids')
+    if ids_param is not None:
+        try:
+            product_ids = {int(product_id) for product_id in ids_param.split(',') if product_id.strip()}
+        except ValueError:
+            return jsonify({'message': 'Parametro ids invalido'}), 400
+        if not product_ids:
+            return jsonify([])
+        products = Products.query.filter(Products.id.in_(product_ids)).all()
+        return jsonify(shape_rows([_product_to_dict(product) for product in products]))
+
+    query = _filtered_products_query()
+
+    if wants_unpaginated():
+        etag, body = product_cache.get_or_load(
+            product_cache.list_key(),
+            lambda: shape_rows([_product_to_dict(product) for product in query.order_by(Products.id).all()])
+        )
+        return cached_json_response(etag, body)
+
+    try:
+        limit, after, descending = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': f'Parametros de paginacion invalidos: {str(e)}'}), 400
+
+    def load_page():
+        products, next_cursor = keyset_page(query, Products.id, limit, after, descending)
+        return page_response([_product_to_dict(product) for product in products], next_cursor, limit)
+
+    etag, body = product_cache.get_or_load(product_cache.list_key(), load_page)
+    return cached_json_response(etag, body)
+
+@product_controller.route('/api/products/export', methods=['GET'])
+def export_products():
+    log_event(logger, logging.DEBUG, 'exportando productos')
+    return stream_export(_filtered_products_query().order_by(Products.id), _product_to_dict, 'products')
+
+def _filtered_products_query():
+    query = Products.query
+    name_prefix = request.args.get('name')
+    if name_prefix:
+        query = query.filter(Products.name.like(escape_like(name_prefix) + '%', escape='\\'))
+    return query
+
+def _product_to_dict(product):
+    return {'id': product.id, 'name': product.name, 'price': product.price, 'quantity': product.quantity}
 
 @product_controller.route('/api/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
-    print("obteniendo producto")
-    product = Products.query.get_or_404(product_id)
-    return jsonify({'id': product.id, 'name': product.name, 'price': product.price, 'quantity': product.quantity})
+    log_event(logger, logging.DEBUG, 'obteniendo producto', product_id=product_id)
+    etag, body = product_cache.get_or_load(
+        f'item:{product_id}',
+        lambda: _product_to_dict(Products.query.get_or_404(product_id))
+    )
+    return cached_json_response(etag, body)
+
+@product_controller.route('/api/products/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(product_cache.stats())
 
 @product_controller.route('/api/products', methods=['POST'])
 def create_product():
-    print("creando producto")
+    log_event(logger, logging.DEBUG, 'creando producto')
     data = request.json
     new_product = Products(
         name=data.get('name', ''), 
@@ -29,23 +94,262 @@ def create_product():
     )
     db.session.add(new_product)
     db.session.commit()
+    product_cache.invalidate()
     return jsonify({'message': 'Product created successfully'}), 201
 
+@product_controller.route('/api/products/bulk', methods=['POST'])
+def bulk_create_products():
+    """
+    Crea productos en lote a partir de un arreglo JSON o un flujo NDJSON.
+    Las filas validas se insertan con bulk_insert_mappings en bloques de
+    ?chunk_size= filas (una transaccion por bloque); cada fila creada
+    devuelve su id.
+    """
+    log_event(logger, logging.DEBUG, 'creando productos en lote')
+
+    def write(mappings):
+        # Copies: return_defaults fills in the new ids, and a chunk retried row by row must start clean
+        rows = [dict(mapping) for mapping in mappings]
+        db.session.bulk_insert_mappings(Products, rows, return_defaults=True)
+        return [{'id': row['id']} for row in rows]
+
+    return _run_product_bulk(lambda row: _validate_product_row(row, partial=False), write, 201)
+
+@product_controller.route('/api/products/bulk', methods=['PATCH'])
+def bulk_update_products():
+    """Actualizacion parcial en lote; cada fila lleva su id y solo los campos a cambiar"""
+    log_event(logger, logging.DEBUG, 'actualizando productos en lote')
+
+    def write(mappings):
+        existing = _existing_product_ids(mapping['id'] for mapping in mappings)
+        db.session.bulk_update_mappings(Products, [m for m in mappings if m['id'] in existing])
+        return [None if m['id'] in existing else _not_found(m['id']) for m in mappings]
+
+    return _run_product_bulk(lambda row: _validate_product_row(row, partial=True), write, 200)
+
+@product_controller.route('/api/products/bulk', methods=['DELETE'])
+def bulk_delete_products():
+    """Elimina en lote; recibe ids sueltos o objetos {"id": ...}"""
+    log_event(logger, logging.DEBUG, 'eliminando productos en lote')
+
+    def write(mappings):
+        existing = _existing_product_ids(mapping['id'] for mapping in mappings)
+        if existing:
+            Products.query.filter(Products.id.in_(existing)).delete(synchronize_session=False)
+        return [None if m['id'] in existing else _not_found(m['id']) for m in mappings]
+
+    return _run_product_bulk(lambda row: {'id': parse_row_id(row)}, write, 200)
+
+def _run_product_bulk(validate, write, success_status):
+    try:
+        result = bulk_write(db.session, iter_bulk_rows(), validate, write, success_status, bulk_chunk_size())
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        # Chunks committed before the failure are visible; item entries expire with the TTL
+        product_cache.invalidate()
+        return jsonify({'message': f'Error en la operacion en lote: {str(e)}'}), 500
+
+    product_cache.invalidate(*(
+        f'item:{row["id"]}' for row in result['results']
+        if 'id' in row and row['status'] == success_status
+    ))
+    return jsonify(result)
+
+def _validate_product_row(row, partial):
+    if not isinstance(row, dict):
+        raise ValueError('Cada fila debe ser un objeto JSON')
+    mapping = {}
+    if partial:
+        mapping['id'] = parse_row_id(row)
+    if 'name' in row or not partial:
+        name = row.get('name')
+        if not isinstance(name, str) or not name.strip() or len(name) > 255:
+            raise ValueError('name es obligatorio (maximo 255 caracteres)')
+        mapping['name'] = name
+    for field in ('price', 'quantity'):
+        if field in row or not partial:
+            value = row.get(field, 0)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f'{field} debe ser un entero mayor o igual a 0')
+            mapping[field] = value
+    if partial and len(mapping) == 1:
+        raise ValueError('No hay campos para actualizar')
+    return mapping
+
+def _existing_product_ids(product_ids):
+    product_ids = set(product_ids)
+    return {
+        product_id for (product_id,) in
+        db.session.query(Products.id).filter(Products.id.in_(product_ids)).all()
+    }
+
+def _not_found(product_id):
+    return {'status': 404, 'message': f'Producto con ID {product_id} no encontrado'}
+
+@product_controller.route('/api/products/reserve', methods=['POST'])
+def reserve_products():
+    """
+    Reserva stock de varios productos de forma atomica.
+    Recibe {"items": [{"id": 1, "quantity": 2}, ...]} y descuenta cada cantidad
+    con un UPDATE condicional (quantity >= solicitado) dentro de una sola
+    transaccion: o se aplican todos los descuentos o ninguno.
+    Si se envia "reservationId", la reserva se aplica una sola vez y los
+    reintentos reciben el resultado original.
+    """
+    log_event(logger, logging.DEBUG, 'reservando stock')
+    data = request.get_json(silent=True) or {}
+    try:
+        deltas = _parse_reservation_items(data.get('items'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        status, result = _process_reservation(data.get('reservationId'), deltas)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error al reservar stock: {str(e)}'}), 500
+
+    if status == 200 and not result.get('duplicate'):
+        product_cache.invalidate(*(f'item:{product_id}' for product_id in deltas))
+    return jsonify(result), status
+
+@product_controller.route('/api/products/reservations/batch', methods=['POST'])
+def reserve_products_batch():
+    """
+    Aplica varias reservas identificadas por reservationId en una sola transaccion.
+    Cada reserva es atomica por si misma (savepoint) y su resultado se guarda,
+    de modo que reenviar el lote no vuelve a descontar stock.
+    Recibe {"reservations": [{"reservationId": "...", "items": [...]}, ...]}.
+    """
+    log_event(logger, logging.DEBUG, 'reservando stock por lotes')
+    data = request.get_json(silent=True) or {}
+    reservations = data.get('reservations')
+    if not isinstance(reservations, list):
+        return jsonify({'message': 'Falta o es invalida la lista de reservas'}), 400
+
+    results = []
+    touched = set()
+    try:
+        for reservation in reservations:
+            reservation_id = reservation.get('reservationId') if isinstance(reservation, dict) else None
+            if not reservation_id:
+                results.append({'reservationId': None, 'status': 400, 'message': 'Falta reservationId'})
+                continue
+            try:
+                deltas = _parse_reservation_items(reservation.get('items'))
+            except ValueError as e:
+                results.append({'reservationId': reservation_id, 'status': 400, 'message': str(e)})
+                continue
+            status, result = _process_reservation(reservation_id, deltas)
+            result['status'] = status
+            results.append(result)
+            if status == 200 and not result.get('duplicate'):
+                touched.update(deltas)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error al reservar stock: {str(e)}'}), 500
+
+    if touched:
+        product_cache.invalidate(*(f'item:{product_id}' for product_id in touched))
+    return jsonify({'results': results})
+
+def _parse_reservation_items(items):
+    """Validates reservation items and merges repeated ids so each row is touched once"""
+    if not items or not isinstance(items, list):
+        raise ValueError('Falta o es invalida la lista de items')
+    deltas = {}
+    try:
+        for item in items:
+            product_id = int(item.get('id'))
+            quantity = int(item.get('quantity', 0))
+            if quantity <= 0:
+                raise ValueError(f'Cantidad invalida para el producto {product_id}')
+            deltas[product_id] = deltas.get(product_id, 0) + quantity
+    except (TypeError, AttributeError):
+        raise ValueError('Formato de items invalido')
+    return deltas
+
+def _process_reservation(reservation_id, deltas):
+    """
+    Applies one reservation inside the caller's transaction (the caller commits).
+    
+    Returns:
+        tuple: (HTTP status code, result dict)
+    """
+    result = {
+        'reservationId': reservation_id,
+        'items': [{'id': product_id, 'quantity': quantity} for product_id, quantity in sorted(deltas.items())]
+    }
+
+    record = None
+    if reservation_id:
+        previous = db.session.get(StockReservations, reservation_id)
+        if previous is not None:
+            result.update({'message': previous.message, 'duplicate': True})
+            return previous.statusCode, result
+        try:
+            with db.session.begin_nested():
+                record = StockReservations(reservation_id)
+                db.session.add(record)
+        except IntegrityError:
+            # Same reservation being applied concurrently; the caller should retry later
+            result.update({'message': 'Reserva en curso', 'duplicate': True})
+            return 503, result
+
+    status, message = 200, 'Stock reserved successfully'
+    try:
+        with db.session.begin_nested():
+            # Lock rows in id order to avoid deadlocks between concurrent reservations
+            for product_id in sorted(deltas):
+                quantity = deltas[product_id]
+                update_result = db.session.execute(
+                    update(Products)
+                    .where(Products.id == product_id, Products.quantity >= quantity)
+                    .values(quantity=Products.quantity - quantity)
+                    .execution_options(synchronize_session=False)
+                )
+                if update_result.rowcount != 1:
+                    raise _ReservationRejected(product_id)
+    except _ReservationRejected as rejected:
+        result['id'] = rejected.product_id
+        if db.session.get(Products, rejected.product_id) is None:
+            status, message = 404, f'Producto con ID {rejected.product_id} no encontrado'
+        else:
+            status, message = 409, f'Stock insuficiente para el producto {rejected.product_id}'
+
+    if record is not None:
+        record.statusCode = status
+        record.message = message
+    result['message'] = message
+    return status, result
+
+class _ReservationRejected(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
 @product_controller.route('/api/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
-    print("actualizando producto")
+    log_event(logger, logging.DEBUG, 'actualizando producto', product_id=product_id)
     product = Products.query.get_or_404(product_id)
     data = request.json
     product.name = data.get('name', product.name)
     product.price = data.get('price', product.price)
     product.quantity = data.get('quantity', product.quantity)
     db.session.commit()
+    product_cache.invalidate(f'item:{product_id}')
     return jsonify({'message': 'Product updated successfully'})
 
 @product_controller.route('/api/products/<int:product_id>', methods=['DELETE'])
 def delete_product(product_id):
-    print("eliminando producto")
+    log_event(logger, logging.DEBUG, 'eliminando producto', product_id=product_id)
     product = Products.query.get_or_404(product_id)
     db.session.delete(product)
     db.session.commit()
+    product_cache.invalidate(f'item:{product_id}')
     return jsonify({'message': 'Product deleted successfully'})
\ No newline at end of file
@@ -0,0 +1,16 @@
+from db.db import db
+from datetime import datetime
+
+class StockReservations(db.Model):
+    __tablename__ = 'stock_reservations'
+
+    reservationId = db.Column(db.String(64), primary_key=True)
+    statusCode = db.Column(db.Integer, nullable=False)
+    message = db.Column(db.String(255), nullable=True)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, reservationId, statusCode=200, message=None):
+        self.reservationId = reservationId
+        self.statusCode = statusCode
+        self.message = message
+        self.createdAt = datetime.utcnow()
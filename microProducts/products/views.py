@@ -5,14 +5,22 @@ from flask_cors import CORS
 import os
 import logging
 from shared.consul_utils import register_service_with_consul
+from shared.database import pool_stats
+from shared.log import configure_logging
+from shared.metrics import init_metrics
+from shared.tracing import init_tracing
+from shared.responses import init_responses
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(os.getenv('SERVICE_NAME', 'microproducts'))
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'secret123'
 app.config.from_object('config.Config')
 db.init_app(app)
+init_metrics(app, db)
+init_tracing(app, os.getenv('SERVICE_NAME', 'microproducts'), db)
+init_responses(app)
 
 # Registrando el blueprint del controlador de productos
 app.register_blueprint(product_controller)
@@ -29,5 +37,10 @@ def health_check():
         logger.error(f"Health check failed: {e}")
         return jsonify({"status": "unhealthy", "service": "microproducts", "error": str(e)}), 500
 
+@app.route('/pool/stats')
+def get_pool_stats():
+    """Connection pool statistics for every database bind"""
+    return jsonify(pool_stats(db)), 200
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
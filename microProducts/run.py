@@ -2,16 +2,23 @@ from products.views import app
 from db.db import db
 from products.models.product_model import Products
 import time
+import logging
 import sys
 import os
 from shared.consul_utils import register_service_with_consul
+from shared.server import run_server
+from shared.migrations import apply_migrations
+
+logger = logging.getLogger(__name__)
 
 def create_tables_with_retry(max_retries=30, delay=2):
-    """Create database tables with retry logic"""
+    """Apply pending schema migrations with retry logic"""
     for attempt in range(max_retries):
         try:
             with app.app_context():
-                db.create_all()
+                applied = apply_migrations(db.engine, os.getenv('SERVICE_NAME', 'microproducts'))
+                if applied:
+                    logger.info(f"Applied migrations: {', '.join(applied)}")
                 
                 # Create sample products if they don't exist
                 if Products.query.count() == 0:
@@ -25,31 +32,33 @@ def create_tables_with_retry(max_retries=30, delay=2):
                         db.session.add(product)
                     
                     db.session.commit()
-                    print("Sample products created")
+                    logger.info("Sample products created")
                 else:
-                    print("Products already exist")
+                    logger.info("Products already exist")
                     
-            print("Database tables created successfully")
+            logger.info("Database schema is up to date")
             return True
         except Exception as e:
-            print(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
             if attempt < max_retries - 1:
-                print(f"Retrying in {delay} seconds...")
+                logger.info(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
             else:
-                print("Failed to connect to database after all retries")
+                logger.error("Failed to connect to database after all retries")
                 sys.exit(1)
 
 if __name__ == '__main__':
     create_tables_with_retry()
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        sys.exit(0)
     
     # Register with Consul
     service_name = os.getenv('SERVICE_NAME', 'microproducts')
     service_port = int(os.getenv('SERVICE_PORT', 5003))
     
     if register_service_with_consul(service_name, service_port):
-        print(f"Service {service_name} registered with Consul successfully")
+        logger.info(f"Service {service_name} registered with Consul successfully")
     else:
-        print(f"Failed to register {service_name} with Consul")
+        logger.warning(f"Failed to register {service_name} with Consul")
     
-    app.run(host='0.0.0.0', port=service_port)
\ No newline at end of file
+    run_server(app, service_port, db)
\ No newline at end of file
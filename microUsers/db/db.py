@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from shared.database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
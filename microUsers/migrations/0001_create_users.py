@@ -0,0 +1,12 @@
+import sqlalchemy as sa
+from shared.migrations import create_table
+
+def upgrade(conn):
+    create_table(conn, sa.Table(
+        'users', sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(100), nullable=False),
+        sa.Column('username', sa.String(100), nullable=False),
+        sa.Column('password', sa.String(255), nullable=False),
+    ))
@@ -0,0 +1,8 @@
+from shared.migrations import create_index, require_unique
+
+def upgrade(conn):
+    # login looks users up by username; both columns must be unique.
+    # Duplicates stop the migration with the offending values listed (see require_unique)
+    require_unique(conn, 'users', ['username', 'email'])
+    create_index(conn, 'ix_users_username', 'users', ['username'], unique=True)
+    create_index(conn, 'ix_users_email', 'users', ['email'], unique=True)
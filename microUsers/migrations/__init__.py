@@ -0,0 +1 @@
+# Versioned schema migrations, applied in order by shared.migrations
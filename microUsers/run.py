@@ -2,16 +2,23 @@ from users.views import app
 from db.db import db
 from users.models.user_model import Users
 import time
+import logging
 import sys
 import os
 from shared.consul_utils import register_service_with_consul
+from shared.server import run_server
+from shared.migrations import apply_migrations, MigrationDataError
+
+logger = logging.getLogger(__name__)
 
 def create_tables_with_retry(max_retries=30, delay=2):
-    """Create database tables with retry logic"""
+    """Apply pending schema migrations with retry logic"""
     for attempt in range(max_retries):
         try:
             with app.app_context():
-                db.create_all()
+                applied = apply_migrations(db.engine, os.getenv('SERVICE_NAME', 'microusers'))
+                if applied:
+                    logger.info(f"Applied migrations: {', '.join(applied)}")
                 
                 # Create admin user if it doesn't exist
                 admin_user = Users.query.filter_by(username='admin').first()
@@ -34,31 +41,37 @@ def create_tables_with_retry(max_retries=30, delay=2):
                             db.session.add(user)
                     
                     db.session.commit()
-                    print("Admin user and sample data created")
+                    logger.info("Admin user and sample data created")
                 else:
-                    print("Admin user already exists")
+                    logger.info("Admin user already exists")
                     
-            print("Database tables created successfully")
+            logger.info("Database schema is up to date")
             return True
+        except MigrationDataError as e:
+            # Not transient: retrying would only delay the same failure
+            logger.error(f"Migration blocked by existing data: {str(e)}")
+            sys.exit(1)
         except Exception as e:
-            print(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
             if attempt < max_retries - 1:
-                print(f"Retrying in {delay} seconds...")
+                logger.info(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
             else:
-                print("Failed to connect to database after all retries")
+                logger.error("Failed to connect to database after all retries")
                 sys.exit(1)
 
 if __name__ == '__main__':
     create_tables_with_retry()
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        sys.exit(0)
     
     # Register with Consul
     service_name = os.getenv('SERVICE_NAME', 'microusers')
     service_port = int(os.getenv('SERVICE_PORT', 5002))
     
     if register_service_with_consul(service_name, service_port):
-        print(f"Service {service_name} registered with Consul successfully")
+        logger.info(f"Service {service_name} registered with Consul successfully")
     else:
-        print(f"Failed to register {service_name} with Consul")
+        logger.warning(f"Failed to register {service_name} with Consul")
     
-    app.run(host='0.0.0.0', port=service_port)
+    run_server(app, service_port, db)
@@ -1,53 +1,194 @@
 from flask import Blueprint, request, jsonify, session, g
 from users.models.user_model import Users
 from db.db import db
+import logging
+from shared.log import log_event
 from datetime import timedelta
+import math
+import os
+from shared.pagination import wants_unpaginated, parse_page_args, keyset_page, page_response
+from shared.streaming import stream_export
+from shared.responses import shape_rows
+from shared.conditional import collection_validators, page_validators, resource_validators, conditional_json
+from shared.passwords import hash_password, verify_password, burn_verification, PasswordHasherBusy
+from shared.rate_limit import token_bucket_limiter
+from shared.bulk import iter_bulk_rows, bulk_write, bulk_chunk_size, parse_row_id
 
 
 user_controller = Blueprint('user_controller', __name__)
+logger = logging.getLogger(__name__)
+
+# Login attempts per minute (and burst) allowed per username and per client IP;
+# every attempt costs one password hash, so this caps KDF CPU spent on brute force.
+# Buckets are shared by the workers, otherwise each one would allow the full limit
+_login_user_limiter = token_bucket_limiter(
+    'login_user',
+    rate=float(os.getenv('LOGIN_USER_RATE_PER_MINUTE', '5')) / 60,
+    capacity=float(os.getenv('LOGIN_USER_BURST', '5'))
+)
+_login_ip_limiter = token_bucket_limiter(
+    'login_ip',
+    rate=float(os.getenv('LOGIN_IP_RATE_PER_MINUTE', '30')) / 60,
+    capacity=float(os.getenv('LOGIN_IP_BURST', '20'))
+)
 
 @user_controller.route('/api/users', methods=['GET'])
 def get_users():
-    print("listado de usuarios")
+    log_event(logger, logging.DEBUG, 'listado de usuarios')
 
     #print(g.__dict__)
 
-    users = Users.query.all()
-    result = [{'id':user.id, 'name': user.name, 'email': user.email, 'username': user.username} for user in users]
-    return jsonify(result)
+    if wants_unpaginated():
+        etag, last_modified = collection_validators(Users.query, Users.updatedAt, Users.id)
+        return conditional_json(etag, last_modified, lambda: shape_rows([
+            _user_to_dict(user) for user in Users.query.order_by(Users.id).all()
+        ]))
+
+    try:
+        limit, after, descending = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': f'Invalid pagination parameters: {str(e)}'}), 400
+
+    users, next_cursor = keyset_page(Users.query, Users.id, limit, after, descending)
+    etag, last_modified = page_validators(users, next_cursor, Users.updatedAt, Users.id)
+    return conditional_json(etag, last_modified, lambda: page_response(
+        [_user_to_dict(user) for user in users], next_cursor, limit
+    ))
+
+@user_controller.route('/api/users/export', methods=['GET'])
+def export_users():
+    log_event(logger, logging.DEBUG, 'exportando usuarios')
+    return stream_export(Users.query.order_by(Users.id), _user_to_dict, 'users')
+
+def _user_to_dict(user):
+    return {'id': user.id, 'name': user.name, 'email': user.email, 'username': user.username}
 
 # Get single user by id
 @user_controller.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    print("obteniendo usuario")
+    log_event(logger, logging.DEBUG, 'obteniendo usuario', user_id=user_id)
     user = Users.query.get_or_404(user_id)
-    return jsonify({'id': user.id, 'name': user.name, 'email': user.email, 'username': user.username})
+    etag, last_modified = resource_validators(user.id, user.updatedAt)
+    return conditional_json(etag, last_modified, lambda: _user_to_dict(user))
 
 @user_controller.route('/api/users', methods=['POST'])
 def create_user():
-    print("creando usuario")
+    log_event(logger, logging.DEBUG, 'creando usuario')
     data = request.json
+    try:
+        password = hash_password(data.get('password', ''))
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Server busy, try again later'}), 503
     #new_user = Users(name="oscar", email="oscar@gmail", username="omondragon", password="123")
     new_user = Users(
         name=data.get('name', ''), 
         email=data.get('email', ''), 
         username=data.get('username', ''), 
-        password=data.get('password', '')
+        password=password
     )
     db.session.add(new_user)
     db.session.commit()
     return jsonify({'message': 'User created successfully'}), 201
 
+@user_controller.route('/api/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """
+    Creates users from a JSON array or an NDJSON stream, inserted with
+    bulk_insert_mappings in chunks of ?chunk_size= rows; each created
+    row's result carries its new id.
+    """
+    log_event(logger, logging.DEBUG, 'creando usuarios en lote')
+
+    def write(mappings):
+        # Copies: return_defaults fills in the new ids, and a chunk retried row by row must start clean
+        rows = [dict(mapping) for mapping in mappings]
+        db.session.bulk_insert_mappings(Users, rows, return_defaults=True)
+        return [{'id': row['id']} for row in rows]
+
+    return _run_user_bulk(lambda row: _validate_user_row(row, partial=False), write, 201)
+
+@user_controller.route('/api/users/bulk', methods=['PATCH'])
+def bulk_update_users():
+    """Partial update in bulk; each row carries its id and only the fields to change"""
+    log_event(logger, logging.DEBUG, 'actualizando usuarios en lote')
+
+    def write(mappings):
+        existing = _existing_user_ids(mapping['id'] for mapping in mappings)
+        db.session.bulk_update_mappings(Users, [m for m in mappings if m['id'] in existing])
+        return [None if m['id'] in existing else _user_not_found(m['id']) for m in mappings]
+
+    return _run_user_bulk(lambda row: _validate_user_row(row, partial=True), write, 200)
+
+@user_controller.route('/api/users/bulk', methods=['DELETE'])
+def bulk_delete_users():
+    """Deletes in bulk; accepts bare ids or {"id": ...} objects"""
+    log_event(logger, logging.DEBUG, 'eliminando usuarios en lote')
+
+    def write(mappings):
+        existing = _existing_user_ids(mapping['id'] for mapping in mappings)
+        if existing:
+            Users.query.filter(Users.id.in_(existing)).delete(synchronize_session=False)
+        return [None if m['id'] in existing else _user_not_found(m['id']) for m in mappings]
+
+    return _run_user_bulk(lambda row: {'id': parse_row_id(row)}, write, 200)
+
+def _run_user_bulk(validate, write, success_status):
+    try:
+        result = bulk_write(db.session, iter_bulk_rows(), validate, write, success_status, bulk_chunk_size())
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify({'message': 'Server busy, try again later'}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Bulk operation failed: {str(e)}'}), 500
+    return jsonify(result)
+
+def _validate_user_row(row, partial):
+    if not isinstance(row, dict):
+        raise ValueError('Each row must be a JSON object')
+    mapping = {}
+    if partial:
+        mapping['id'] = parse_row_id(row)
+    for field in ('name', 'email', 'username'):
+        if field in row or not partial:
+            value = row.get(field)
+            if not isinstance(value, str) or not value.strip() or len(value) > 100:
+                raise ValueError(f'{field} is required (max 100 characters)')
+            mapping[field] = value
+    if 'password' in row or not partial:
+        password = row.get('password')
+        if not isinstance(password, str) or not password:
+            raise ValueError('password is required')
+        mapping['password'] = hash_password(password)
+    if partial and len(mapping) == 1:
+        raise ValueError('No fields to update')
+    return mapping
+
+def _existing_user_ids(user_ids):
+    user_ids = set(user_ids)
+    return {user_id for (user_id,) in db.session.query(Users.id).filter(Users.id.in_(user_ids)).all()}
+
+def _user_not_found(user_id):
+    return {'status': 404, 'message': f'User {user_id} not found'}
+
 # Update an existing user
 @user_controller.route('/api/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
-    print("actualizando usuario")
+    log_event(logger, logging.DEBUG, 'actualizando usuario', user_id=user_id)
     user = Users.query.get_or_404(user_id)
     data = request.json
     user.name = data.get('name', user.name)
     user.email = data.get('email', user.email)
     user.username = data.get('username', user.username)
-    user.password = data.get('password', user.password)
+    # A blank password keeps the current one
+    if data.get('password'):
+        try:
+            user.password = hash_password(data['password'])
+        except PasswordHasherBusy:
+            return jsonify({'message': 'Server busy, try again later'}), 503
     db.session.commit()
     return jsonify({'message': 'User updated successfully'})
 
@@ -69,23 +210,40 @@ def login():
     if not username or not password:
         return jsonify({'message': 'Missing username or password'}),400
 
-    user = Users.query.filter_by(username=username).first()
-
-    if not user:
-        return jsonify({'message': 'Invalid username or password'}), 401
+    for limiter, key in ((_login_ip_limiter, request.remote_addr or ''), (_login_user_limiter, username)):
+        allowed, retry_after = limiter.acquire(key)
+        if not allowed:
+            response = jsonify({'message': 'Too many login attempts, try again later'})
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
 
-    #if not check_password_hash(user.password, password):
-    if user.password != password:
-        return jsonify({'message': 'Invalid username or password'}), 401
+    user = Users.query.filter_by(username=username).first()
 
-    # Store user information in session
+    try:
+        if not user:
+            burn_verification(password)
+            return jsonify({'message': 'Invalid username or password'}), 401
+
+        matches, rehash = verify_password(user.password, password)
+        if not matches:
+            return jsonify({'message': 'Invalid username or password'}), 401
+
+        # Legacy plaintext rows and hashes with an outdated cost are upgraded transparently
+        if rehash:
+            user.password = hash_password(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Server busy, try again later'}), 503
+
+    # Store user information in the server-side session under a fresh id
+    session.clear()
+    session.regenerate()
     session['user_id'] = user.id
     session['username'] = user.username
     session['email'] = user.email  # Add other user information as needed
 
     #g.user=user
 
-    #print(g.__dict__)
-    print("En session: ",session)
+    log_event(logger, logging.INFO, 'login successful', user_id=user.id)
 
     return jsonify({'message': 'Login successful'})
@@ -1,11 +1,21 @@
 from db.db import db
+from datetime import datetime
+from sqlalchemy.dialects import mysql
 
 class Users(db.Model):
+    # Created by migrations/0003_users_unique_login_columns.py
+    __table_args__ = (
+        db.Index('ix_users_username', 'username', unique=True),
+        db.Index('ix_users_email', 'email', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    username = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
+    updatedAt = db.Column(db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql'), nullable=True,
+                          default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __init__(self, name, email, username, password):
         self.name = name
@@ -5,14 +5,28 @@ from flask_cors import CORS
 import os
 import logging
 from shared.consul_utils import register_service_with_consul
+from shared.database import pool_stats
+from shared.log import configure_logging
+from shared.metrics import init_metrics
+from shared.tracing import init_tracing
+from shared.responses import init_responses
+from shared.sessions import server_session_interface
+from shared.proxy import trust_forwarded_for
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(os.getenv('SERVICE_NAME', 'microusers'))
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.secret_key = 'secret123'
+# Sessions live server-side and are shared with the other services through the store
+app.session_interface = server_session_interface()
 app.config.from_object('config.Config')
+# Behind the frontend gateway the client address arrives in X-Forwarded-For;
+# login rate limits key on it, so it is only trusted when the gateway sent it
+trust_forwarded_for(app)
 db.init_app(app)
+init_metrics(app, db)
+init_tracing(app, os.getenv('SERVICE_NAME', 'microusers'), db)
+init_responses(app)
 
 # Registrando el blueprint del controlador de usuarios
 app.register_blueprint(user_controller)
@@ -29,5 +43,10 @@ def health_check():
         logger.error(f"Health check failed: {e}")
         return jsonify({"status": "unhealthy", "service": "microusers", "error": str(e)}), 500
 
+@app.route('/pool/stats')
+def get_pool_stats():
+    """Connection pool statistics for every database bind"""
+    return jsonify(pool_stats(db)), 200
+
 if __name__ == '__main__':
     app.run()
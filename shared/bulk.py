@@ -0,0 +1,155 @@
+"""
+Bulk write helpers for microservice endpoints
+Requests carry a JSON array (or {"items": [...]}) or an NDJSON stream
+(Content-Type application/x-ndjson). Rows are validated one by one and
+written in chunks of BULK_CHUNK_SIZE with executemany-style statements,
+one transaction per chunk, and every row gets its own result entry.
+A row the database refuses (duplicate, value too long) is reported on its
+own and does not fail the request.
+"""
+import os
+import json
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import request
+from sqlalchemy.exc import DBAPIError, IntegrityError, InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '1000'))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+
+
+def iter_bulk_rows() -> Iterator:
+    """
+    Yields the rows of the request body; a malformed NDJSON line is yielded as a ValueError.
+
+    Raises:
+        ValueError: If a JSON body is not an array or {"items": [...]}
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        # Read line by line so large imports are never held in memory as one document
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f'JSON invalido: {e}')
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items', data.get('ids'))
+    if not isinstance(data, list):
+        raise ValueError('Se esperaba un arreglo JSON o un flujo NDJSON')
+    yield from data
+
+
+def parse_row_id(row) -> int:
+    """Id of a row given either as a bare id or as {"id": ...}"""
+    value = row.get('id') if isinstance(row, dict) else row
+    if isinstance(value, bool):
+        raise ValueError('id invalido')
+    try:
+        row_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('id invalido')
+    if row_id <= 0:
+        raise ValueError('id invalido')
+    return row_id
+
+
+def _row_error(error: DBAPIError) -> Optional[Dict]:
+    """Result for a row the database refused, or None when the failure is not the row's (connection, server)"""
+    if isinstance(error, IntegrityError):
+        return {'status': 409, 'message': f'Conflicto: {error.orig}'}
+    if error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError)):
+        return None
+    # DataError and the like: a value the column cannot hold (e.g. too long on MySQL)
+    return {'status': 400, 'message': f'Datos invalidos: {error.orig}'}
+
+
+def _flush(session, chunk: List[Tuple[int, Dict]], write: Callable, success_status: int,
+           results: List[Optional[Dict]]):
+    mappings = [mapping for _, mapping in chunk]
+    try:
+        outcomes = write(mappings)
+        session.commit()
+    except DBAPIError as e:
+        session.rollback()
+        if _row_error(e) is None:
+            raise
+        # Find the offending rows: retry one by one, each in its own savepoint
+        outcomes = []
+        for mapping in mappings:
+            try:
+                with session.begin_nested():
+                    outcomes.append(write([mapping])[0])
+            except DBAPIError as row_e:
+                outcome = _row_error(row_e)
+                if outcome is None:
+                    raise
+                outcomes.append(outcome)
+        session.commit()
+
+    for (index, mapping), outcome in zip(chunk, outcomes):
+        result = {'index': index, 'status': success_status}
+        if 'id' in mapping:
+            result['id'] = mapping['id']
+        if outcome:
+            result.update(outcome)
+        results[index] = result
+
+
+def bulk_write(session, rows: Iterator, validate: Callable, write: Callable,
+               success_status: int = 200, chunk_size: int = None) -> Dict:
+    """
+    Validates and writes rows in chunks, committing once per chunk.
+
+    Args:
+        session: SQLAlchemy session
+        rows: Parsed request rows (see iter_bulk_rows)
+        validate: row -> mapping to write, raising ValueError for invalid rows
+        write: list of mappings -> list with one outcome per mapping, None
+            meaning success or a dict such as {'status': 404, 'message': ...};
+            a dict without 'status' (e.g. {'id': 7}) adds fields to a success
+        success_status: Status reported for rows written successfully
+        chunk_size: Rows per statement/transaction, BULK_CHUNK_SIZE by default
+
+    Returns:
+        dict: {'results': [...], 'summary': {...}}
+    """
+    chunk_size = max(1, chunk_size or BULK_CHUNK_SIZE)
+    results: List[Optional[Dict]] = []
+    chunk: List[Tuple[int, Dict]] = []
+
+    for index, row in enumerate(rows):
+        results.append(None)
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            mapping = validate(row)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 400, 'message': str(e)}
+            continue
+        chunk.append((index, mapping))
+        if len(chunk) >= chunk_size:
+            _flush(session, chunk, write, success_status, results)
+            chunk = []
+    if chunk:
+        _flush(session, chunk, write, success_status, results)
+
+    succeeded = sum(1 for result in results if result['status'] == success_status)
+    return {
+        'results': results,
+        'summary': {'total': len(results), 'succeeded': succeeded, 'failed': len(results) - succeeded}
+    }
+
+
+def bulk_chunk_size() -> int:
+    """?chunk_size= from the query string, bounded to 1..10000"""
+    chunk_size = request.args.get('chunk_size', BULK_CHUNK_SIZE, type=int) or BULK_CHUNK_SIZE
+    return max(1, min(chunk_size, 10000))
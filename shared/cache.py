@@ -0,0 +1,206 @@
+"""
+Read-through response cache for microservices
+Stores serialized JSON bodies with a strong ETag behind a pluggable
+backend: an in-process TTL/LRU cache or any Redis-compatible client.
+Every key embeds a generation counter that writes bump; with several worker
+processes and the memory backend the counter lives in a file under CACHE_DIR
+so an invalidation is seen by all of them.
+"""
+import os
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Response, current_app, request
+
+from shared.server import worker_count
+
+logger = logging.getLogger(__name__)
+
+
+class FileCounters:
+    """Integer counters shared by processes, one file per counter"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # Fixed-length names whatever the counter is called
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key: str) -> Optional[int]:
+        """Current value, None if never incremented; other I/O errors propagate"""
+        try:
+            with open(self._path(key), 'r') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def incr(self, key: str) -> int:
+        path = self._path(key)
+        with open(f'{path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = (self.get(key) or 0) + 1
+            # Write then rename so readers never see an empty counter
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(value))
+            os.replace(tmp_path, path)
+            return value
+
+
+class MemoryCache:
+    """In-process TTL/LRU backend exposing the subset of the Redis API we use"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key])
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ex: float = None):
+        ttl = ex if ex is not None else self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        # Counters never expire and are kept out of the LRU
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+
+class ResponseCache:
+    def __init__(self, namespace: str, backend=None, ttl: float = None, counters=None):
+        """Initialize cache for one resource namespace with environment variables or defaults
+
+        counters holds the generation counter (get/incr); by default the
+        backend itself, or files under CACHE_DIR when the backend is in-process
+        memory and several workers run.
+        """
+        self.namespace = namespace
+        self.ttl = ttl or float(os.getenv('CACHE_TTL', '30'))
+        self.backend = backend or _default_backend(self.ttl)
+        self.counters = counters or _default_counters(self.backend)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _versioned_key(self, key: str, version: int) -> str:
+        return self._key(f"v{version}:{key}")
+
+    @property
+    def version(self) -> int:
+        """Generation counter embedded in every key; bumping it invalidates every entry"""
+        value = self.counters.get(self._key('version'))
+        return int(value) if value is not None else 0
+
+    def list_key(self) -> str:
+        """Cache key for a listing request, derived from the query string"""
+        args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"list:{args}"
+
+    def get_or_load(self, key: str, loader: Callable) -> Tuple[str, str]:
+        """Return (etag, body) for key, calling loader and caching its result on a miss"""
+        # Read once, before loading: a body loaded while a write bumps the version
+        # is stored under the old generation, which is never read again
+        try:
+            cache_key = self._versioned_key(key, self.version)
+        except OSError as e:
+            # Without the current generation a cached body could be stale: skip the cache
+            logger.warning(f"Cache version for {self.namespace} unreadable, loading uncached: {e}")
+            body = current_app.json.dumps(loader())
+            return hashlib.sha1(body.encode('utf-8')).hexdigest(), body
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            if isinstance(cached, bytes):
+                cached = cached.decode('utf-8')
+            with self._lock:
+                self.hits += 1
+            etag, body = cached.split('\n', 1)
+            return etag, body
+
+        with self._lock:
+            self.misses += 1
+        body = current_app.json.dumps(loader())
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        self.backend.set(cache_key, f"{etag}\n{body}", ex=self.ttl)
+        return etag, body
+
+    def invalidate(self, *keys: str):
+        """Drop every cached entry; the given keys are also deleted right away to free memory"""
+        if keys:
+            version = self.version
+            self.backend.delete(*(self._versioned_key(key, version) for key in keys))
+        self.counters.incr(self._key('version'))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'namespace': self.namespace,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+def _default_backend(ttl: float):
+    backend = os.getenv('CACHE_BACKEND', 'memory')
+    if backend == 'redis':
+        try:
+            import redis
+            return redis.Redis.from_url(os.getenv('CACHE_URL', 'redis://localhost:6379/0'))
+        except Exception as e:
+            logger.error(f"Failed to create Redis cache backend, using memory: {e}")
+    return MemoryCache(maxsize=int(os.getenv('CACHE_MAXSIZE', '1024')), ttl=ttl)
+
+
+def _default_counters(backend):
+    if isinstance(backend, MemoryCache) and worker_count() > 1:
+        # A write in one worker must invalidate the entries of all the others
+        return FileCounters(os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'microservices_cache')))
+    return backend
+
+
+def cached_json_response(etag: str, body: str) -> Response:
+    """Build a JSON response for a cached body, answering 304 when the client already has it"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,80 @@
+"""
+Conditional GET helpers for microservice JSON endpoints
+Validators are derived from an updated-at column (one aggregate query for
+full collections, the loaded rows for a page, the row itself for single
+resources), so unchanged data is answered with 304 Not Modified without
+serializing the body. Collections and pages are validated by ETag only:
+a delete does not move max(updated_at), so Last-Modified would miss it.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+
+from flask import Response, jsonify, request
+from sqlalchemy import func
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def collection_validators(query, updated_column, id_column) -> Tuple[str, Optional[datetime]]:
+    """Return (etag, None) for the rows matched by query
+
+    Any insert or update moves max(updated_at) and any delete changes the
+    row count or id sum, so the tag changes whenever the collection does.
+    No Last-Modified is given: max(updated_at) stays put on a delete.
+    """
+    count, id_sum, latest = query.order_by(None).with_entities(
+        func.count(id_column), func.sum(id_column), func.max(updated_column)
+    ).one()
+    args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    seed = f"{request.path}?{args}|{count}|{id_sum}|{latest.isoformat() if latest else ''}"
+    return hashlib.sha1(seed.encode('utf-8')).hexdigest(), None
+
+
+def page_validators(rows, next_cursor, updated_column, id_column) -> Tuple[str, Optional[datetime]]:
+    """Return (etag, None) for one page of rows already loaded
+
+    Only what the page shows is hashed (its ids, their updated-at and the
+    next cursor), so a page costs no query over the rest of the table. As
+    for collections, there is no Last-Modified.
+    """
+    versions = [(getattr(row, id_column.key), getattr(row, updated_column.key)) for row in rows]
+    args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    rows_seed = ','.join(f"{row_id}:{updated_at.isoformat() if updated_at else '0'}" for row_id, updated_at in versions)
+    seed = f"{request.path}?{args}|{rows_seed}|{next_cursor}"
+    return hashlib.sha1(seed.encode('utf-8')).hexdigest(), None
+
+
+def resource_validators(resource_id, updated_at: Optional[datetime]) -> Tuple[str, Optional[datetime]]:
+    """Return (etag, last_modified) for a single row"""
+    version = updated_at.isoformat() if updated_at else '0'
+    seed = f"{request.path}?{request.query_string.decode('utf-8')}|{resource_id}|{version}"
+    return hashlib.sha1(seed.encode('utf-8')).hexdigest(), updated_at
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        # Weak comparison: compressed responses carry the weak form of the tag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        # HTTP dates have second resolution
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(request.if_modified_since)
+    return False
+
+
+def conditional_json(etag: str, last_modified: Optional[datetime], build: Callable) -> Response:
+    """Answer 304 if the client's validators still match, otherwise jsonify(build())"""
+    if is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    return response
@@ -67,14 +67,19 @@ class ConsulClient:
             
             logger.info(f"Service {service_name} registered with ID {service_id} at {service_address}:{service_port}")
             
-            # Register cleanup on exit
-            atexit.register(self.deregister_service, service_id)
+            # Register cleanup on exit; only the registering process deregisters,
+            # so forked server workers exiting do not remove the service
+            atexit.register(self._deregister_on_exit, service_id, os.getpid())
             
             return True
         except Exception as e:
             logger.error(f"Failed to register service {service_name}: {e}")
             return False
 
+    def _deregister_on_exit(self, service_id: str, owner_pid: int):
+        if os.getpid() == owner_pid:
+            self.deregister_service(service_id)
+
     def deregister_service(self, service_id: str) -> bool:
         """Deregister a service from Consul"""
         try:
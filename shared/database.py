@@ -0,0 +1,146 @@
+"""
+SQLAlchemy engine configuration for microservices
+Builds environment-driven pool options, exposes pool statistics and routes
+read-only requests to an optional read replica bind. Pools are sized so
+that all workers of a service together stay within DB_MAX_CONNECTIONS.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import QueuePool
+
+from shared.server import worker_count
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(['GET', 'HEAD'])
+REPLICA_BIND = 'replica'
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+def database_uri(host: str, user: str, password: str, name: str) -> str:
+    return f'mysql+pymysql://{user}:{password}@{host}/{name}'
+
+
+def engine_options(uri: str) -> Dict:
+    """Pool and connection options from environment variables or defaults"""
+    if uri.startswith('sqlite'):
+        # SQLite (local runs) keeps Flask-SQLAlchemy's defaults
+        return {}
+
+    # Connections for the whole service (every worker, background jobs and locks
+    # included); three services share MySQL's default max_connections of 151
+    budget = int(os.getenv('DB_MAX_CONNECTIONS', '40'))
+    workers = worker_count()
+    per_worker = max(1, budget // workers)
+    pool_size = int(os.getenv('DB_POOL_SIZE', str(min(int(os.getenv('WEB_THREADS', '4')), per_worker))))
+    max_overflow = int(os.getenv('DB_MAX_OVERFLOW', str(max(0, min(2, per_worker - pool_size)))))
+    total = workers * (pool_size + max_overflow)
+    logger.log(
+        logging.WARNING if total > budget else logging.INFO,
+        f"Database pool: {workers} worker(s) x ({pool_size} + {max_overflow} overflow) = "
+        f"up to {total} connections (DB_MAX_CONNECTIONS {budget})"
+    )
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Recycle before MySQL's wait_timeout closes idle connections server-side
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '280')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+    if uri.startswith('mysql'):
+        connect_args = {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            'read_timeout': int(os.getenv('DB_READ_TIMEOUT', '30')),
+            'write_timeout': int(os.getenv('DB_WRITE_TIMEOUT', '30')),
+        }
+        statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+        if statement_timeout_ms:
+            connect_args['init_command'] = f'SET SESSION MAX_EXECUTION_TIME={statement_timeout_ms}'
+        options['connect_args'] = connect_args
+
+    return options
+
+
+def replica_binds(user: str, password: str, name: str) -> Dict[str, str]:
+    """SQLALCHEMY_BINDS entry for the read replica when DB_REPLICA_HOST is set"""
+    replica_uri = os.getenv('DATABASE_REPLICA_URL')
+    replica_host = os.getenv('DB_REPLICA_HOST')
+    if not replica_uri and replica_host:
+        replica_uri = database_uri(replica_host, user, password, name)
+    return {REPLICA_BIND: replica_uri} if replica_uri else {}
+
+
+class RoutingSession(Session):
+    """Sends statements of read-only requests (GET/HEAD) to the replica bind if configured"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and REPLICA_BIND in self._db.engines
+            and has_request_context()
+            and request.method in READ_METHODS
+            and not self._flushing
+            and not (self.new or self.dirty or self.deleted)
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _single_pool_stats(engine) -> Dict:
+    pool = engine.pool
+    stats: Dict[str, Optional[float]] = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._wait_lock:
+            stats.update({
+                'checkouts': pool.checkouts,
+                'wait_total_seconds': round(pool.wait_total, 6),
+                'wait_avg_seconds': round(pool.wait_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+                'wait_max_seconds': round(pool.wait_max, 6),
+            })
+    return stats
+
+
+def pool_stats(db) -> Dict:
+    """Statistics for every engine (default and binds) of a Flask-SQLAlchemy instance"""
+    return {
+        (bind_key or 'default'): _single_pool_stats(engine)
+        for bind_key, engine in db.engines.items()
+    }
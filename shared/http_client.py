@@ -0,0 +1,227 @@
+"""
+Inter-service HTTP client for microservices
+Provides pooled keep-alive sessions, timeouts, bounded retries and a
+circuit breaker per upstream service
+"""
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared.metrics import observe_upstream
+from shared.tracing import inject, span
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRYABLE_STATUS = frozenset([502, 503, 504])
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised when calls to an upstream are short-circuited"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Trip after failure_threshold consecutive failures, probe again after reset_timeout"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go through, allowing a single probe when half-open"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._half_open_probe:
+                return False
+            self._half_open_probe = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._half_open_probe = False
+
+    def release_probe(self):
+        """Let another half-open probe through after a call that ended with neither outcome"""
+        with self._lock:
+            self._half_open_probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._half_open_probe = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ServiceHTTPClient:
+    def __init__(self, base_url: str = None, pool_size: int = None,
+                 connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None,
+                 failure_threshold: int = None, reset_timeout: float = None,
+                 service_name: str = None, resolver=None):
+        """Initialize client for one upstream with environment variables or defaults
+
+        When service_name and resolver are given, every call is sent to an
+        instance picked by the resolver and base_url is only used as a fallback
+        while no healthy instance is known.
+        """
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.service_name = service_name
+        self.resolver = resolver
+        self.upstream = service_name or self.base_url
+        self.pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '20'))
+        self.timeout = (
+            connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', '2')),
+            read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('HTTP_MAX_RETRIES', '2'))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('HTTP_BACKOFF_FACTOR', '0.1'))
+        self.breaker = CircuitBreaker(
+            failure_threshold or int(os.getenv('HTTP_BREAKER_THRESHOLD', '5')),
+            reset_timeout or float(os.getenv('HTTP_BREAKER_RESET', '30'))
+        )
+
+        # Keep-alive connection pool sized for the worker's concurrency;
+        # retries are handled below so they can be limited to idempotent calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    @contextmanager
+    def _target(self):
+        """Yield the base URL for one attempt, tracking it as outstanding on the instance"""
+        if self.resolver is None:
+            yield self.base_url
+            return
+        with self.resolver.acquire(self.service_name) as instance:
+            if instance is not None:
+                yield instance.url
+            elif self.base_url:
+                yield self.base_url
+            else:
+                raise requests.ConnectionError(f"No healthy instances of {self.service_name}")
+
+    def request(self, method: str, path: str, retries: int = None, **kwargs) -> requests.Response:
+        """Send a request to the upstream, retrying idempotent calls on transient failures
+
+        retries overrides max_retries for this call (0 for bodies that cannot be replayed)
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        max_retries = self.max_retries if retries is None else retries
+        attempts = 1 + (max_retries if method in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(f"Circuit open for {self.upstream}")
+
+            start = time.perf_counter()
+            try:
+                with self._target() as base_url, span(
+                    f"HTTP {method}", 'client', **{'peer.service': self.upstream, 'http.url': path}
+                ) as call_span:
+                    url = f"{base_url}{path}"
+                    kwargs['headers'] = inject(kwargs.get('headers'))
+                    response = self.session.request(method, url, **kwargs)
+                    call_span.set_attribute('http.status_code', response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                observe_upstream(self.upstream, method, 'error', time.perf_counter() - start)
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"{method} {self.upstream}{path} failed ({e}), retrying")
+            except requests.RequestException:
+                # Broken responses (bad chunking, encoding, headers) count against the upstream
+                observe_upstream(self.upstream, method, 'error', time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Not the upstream's fault, but a half-open probe must not stay taken
+                self.breaker.release_probe()
+                raise
+            else:
+                observe_upstream(self.upstream, method, response.status_code, time.perf_counter() - start)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUS or attempt == attempts - 1:
+                    return response
+                # Hands the connection back to the pool (matters for stream=True calls)
+                response.close()
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+
+            time.sleep(self._backoff(attempt))
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+# One client (session, pool and breaker) per upstream
+_clients: Dict[str, ServiceHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+def get_http_client(base_url: str) -> ServiceHTTPClient:
+    """Get or create the shared client for an upstream base URL"""
+    key = base_url.rstrip('/')
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ServiceHTTPClient(key)
+            _clients[key] = client
+        return client
+
+def get_service_client(service_name: str, fallback_url: str = None) -> ServiceHTTPClient:
+    """Get or create the shared client for a Consul-registered service"""
+    from shared.service_resolver import get_service_resolver
+
+    key = f"service:{service_name}"
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ServiceHTTPClient(
+                fallback_url, service_name=service_name, resolver=get_service_resolver()
+            )
+            _clients[key] = client
+        return client
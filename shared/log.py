@@ -0,0 +1,80 @@
+"""
+Structured logging for microservices
+One JSON object per line (LOG_FORMAT=text for plain lines) at LOG_LEVEL,
+tagged with the current trace and span ids.
+log_event() checks the level and the sample rate before building anything,
+so disabled or sampled-out hot-path events cost a comparison and a random().
+"""
+import os
+import json
+import time
+import random
+import logging
+from typing import Optional
+
+from shared.tracing import current_span
+
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+_service_name = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        if _service_name:
+            entry['service'] = _service_name
+        active = current_span()
+        if active is not None:
+            entry['trace_id'] = active.trace_id
+            entry['span_id'] = active.span_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+def configure_logging(service_name: str):
+    """Install the structured handler on the root logger (replaces logging.basicConfig)"""
+    global _service_name
+    _service_name = service_name
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if os.getenv('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sample: Optional[float] = None, **fields):
+    """
+    Logs event with structured fields.
+
+    Events below WARNING are kept with probability `sample` (LOG_SAMPLE_RATE
+    by default); warnings and errors are never sampled out.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = LOG_SAMPLE_RATE if sample is None else sample
+        if rate < 1.0 and random.random() >= rate:
+            return
+    logger.log(level, event, extra={'fields': fields})
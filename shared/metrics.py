@@ -0,0 +1,369 @@
+"""
+Request metrics for microservices in Prometheus text format
+Per-route latency histograms, in-flight requests, database queries and time
+per request (SQLAlchemy cursor events) and outbound call latency per
+upstream, served on /metrics. With several gunicorn workers each one writes
+a snapshot of its metrics to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds
+and the worker answering a scrape merges all of them, so /metrics reports the
+whole service.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+from flask import Response, g, has_request_context, request
+
+from shared.log import log_event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def snapshot(self) -> list:
+        """[(labels, value), ...] copied under the lock"""
+        raise NotImplementedError
+
+    def merge(self, total, value):
+        """Combine the values of one label set from two processes"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return list(self._values.items())
+
+    def merge(self, total, value):
+        return total + value
+
+    def render(self, items=None):
+        if items is None:
+            items = self.snapshot()
+        return self._header() + [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}'
+            for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+
+    def merge(self, total, value):
+        return ([a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2])
+
+    def render(self, items=None):
+        if items is None:
+            items = self.snapshot()
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        # Shared snapshot directory; None keeps metrics per process
+        self.directory: Optional[str] = os.getenv('METRICS_DIR') or None
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def use_directory(self, path: str):
+        """Aggregate across processes through path; called once in the master before forking"""
+        os.makedirs(path, exist_ok=True)
+        # Snapshots of a previous run would be added to the new counters
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(path, name))
+        self.directory = path
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        """Write this process' metrics to its snapshot file"""
+        if self.directory is None:
+            return
+        data = {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot()]
+            for metric in self._metrics
+        }
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            # Readers never see a half-written snapshot
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {path}: {e}")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def start_flusher(self):
+        """Start the per-process snapshot thread once (threads do not survive fork)"""
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+            atexit.register(self.flush)
+
+    def _collect(self) -> Dict[str, list]:
+        """Metrics of every process that wrote a snapshot, merged per label set"""
+        merged: Dict[str, Dict[Tuple, object]] = {metric.name: {} for metric in self._metrics}
+        kinds = {metric.name: metric for metric in self._metrics}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                pid = int(name[:-len('.json')])
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (ValueError, OSError):
+                continue
+            # Counters of exited workers still count; their gauges are stale
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for metric_name, items in data.items():
+                metric = kinds.get(metric_name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                values = merged[metric_name]
+                for labels, value in items:
+                    labels = tuple(labels)
+                    values[labels] = metric.merge(values[labels], value) if labels in values else value
+        return {name: list(values.items()) for name, values in merged.items()}
+
+    def render(self) -> str:
+        collected = None
+        if self.directory is not None:
+            self.flush()
+            collected = self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(collected[metric.name] if collected is not None else None))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+http_requests_total = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests served', ('method', 'route', 'status')))
+http_request_duration = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'route')))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served'))
+db_queries_total = REGISTRY.register(Counter(
+    'db_queries_total', 'SQL statements executed'))
+db_query_duration_total = REGISTRY.register(Counter(
+    'db_query_duration_seconds_total', 'Time spent executing SQL statements'))
+db_queries_per_request = REGISTRY.register(Histogram(
+    'db_queries_per_request', 'SQL statements executed per HTTP request', ('route',), COUNT_BUCKETS))
+db_time_per_request = REGISTRY.register(Histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL per HTTP request', ('route',)))
+upstream_request_duration = REGISTRY.register(Histogram(
+    'upstream_request_duration_seconds', 'Outbound HTTP call latency', ('upstream', 'method', 'status')))
+
+
+def observe_upstream(upstream: str, method: str, status, seconds: float):
+    """Record one outbound call; status is the HTTP code or 'error'"""
+    upstream_request_duration.observe(seconds, upstream, method, str(status))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_queries_total.inc()
+    db_query_duration_total.inc(amount=elapsed)
+    if has_request_context():
+        g._metrics_db_queries = g.get('_metrics_db_queries', 0) + 1
+        g._metrics_db_time = g.get('_metrics_db_time', 0.0) + elapsed
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+_engine_hooks_installed = False
+_engine_hooks_lock = threading.Lock()
+
+
+def _install_engine_hooks():
+    global _engine_hooks_installed
+    # Imported here: the frontend has no database and does not ship SQLAlchemy
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    with _engine_hooks_lock:
+        if _engine_hooks_installed:
+            return
+        # Listening on the Engine class covers the primary and replica binds alike
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _engine_hooks_installed = True
+
+
+def _route() -> str:
+    # The rule template keeps label cardinality bounded (no raw ids in paths)
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_metrics(app, db=None, metrics_path: str = '/metrics'):
+    """Instrument app (and its database engines if db is given) and expose the registry on metrics_path"""
+    if db is not None:
+        _install_engine_hooks()
+    access_logger = logging.getLogger('access')
+
+    def record(status_code):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        route = _route()
+        http_request_duration.observe(elapsed, request.method, route)
+        http_requests_total.inc(request.method, route, str(status_code))
+        fields = {}
+        if db is not None:
+            queries = g.get('_metrics_db_queries', 0)
+            db_time = g.get('_metrics_db_time', 0.0)
+            db_queries_per_request.observe(queries, route)
+            db_time_per_request.observe(db_time, route)
+            fields = {'db_queries': queries, 'db_ms': round(db_time * 1000, 2)}
+        log_event(
+            access_logger, logging.WARNING if status_code >= 500 else logging.INFO, 'request',
+            method=request.method, route=route, status=status_code,
+            duration_ms=round(elapsed * 1000, 2), **fields
+        )
+
+    @app.before_request
+    def _start_request_metrics():
+        REGISTRY.start_flusher()
+        g._metrics_start = time.perf_counter()
+        g._metrics_in_flight = True
+        http_requests_in_flight.inc()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        # Unhandled exceptions skip after_request; count them as 500s here
+        record(500)
+        if g.pop('_metrics_in_flight', False):
+            http_requests_in_flight.dec()
+
+    @app.route(metrics_path)
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,152 @@
+"""
+Versioned schema migrations for microservices
+Each service keeps numbered modules (0001_xxx.py, 0002_xxx.py, ...) in its
+`migrations` package, each exposing upgrade(connection). Applied versions
+are recorded per service in the shared schema_migrations table. Helpers
+are idempotent so databases created by init.sql or db.create_all() can be
+adopted as-is.
+"""
+import pkgutil
+import logging
+import importlib
+from datetime import datetime
+from contextlib import contextmanager
+from typing import List
+
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    'schema_migrations', _metadata,
+    sa.Column('version', sa.String(255), primary_key=True),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+
+class MigrationDataError(RuntimeError):
+    """Existing data prevents a migration; retrying cannot help until it is cleaned up"""
+
+
+def _discover(package_name: str) -> List[str]:
+    package = importlib.import_module(package_name)
+    return sorted(
+        name for _, name, is_pkg in pkgutil.iter_modules(package.__path__)
+        if not is_pkg and name[:4].isdigit()
+    )
+
+
+@contextmanager
+def _migration_lock(engine):
+    """Serialize concurrent runners (several replicas starting at once) on MySQL"""
+    if engine.dialect.name != 'mysql':
+        yield
+        return
+    with engine.connect() as conn:
+        # 1: acquired; 0: another runner held it past the timeout; NULL: server error
+        acquired = conn.execute(sa.text("SELECT GET_LOCK('schema_migrations', 120)")).scalar()
+        if acquired != 1:
+            # Raised so the caller's startup retry loop tries again instead of migrating unlocked
+            raise RuntimeError(f"Could not acquire the schema_migrations lock (GET_LOCK returned {acquired})")
+        try:
+            yield
+        finally:
+            conn.execute(sa.text("SELECT RELEASE_LOCK('schema_migrations')"))
+
+
+def pending_migrations(engine, namespace: str, package_name: str = 'migrations') -> List[str]:
+    """Versions in package_name not yet recorded for namespace (the service name)"""
+    with engine.connect() as conn:
+        if not sa.inspect(conn).has_table('schema_migrations'):
+            return _discover(package_name)
+        applied = {
+            row[0].split('/', 1)[1]
+            for row in conn.execute(
+                sa.select(schema_migrations.c.version)
+                .where(schema_migrations.c.version.like(f"{namespace}/%"))
+            )
+        }
+    return [version for version in _discover(package_name) if version not in applied]
+
+
+def apply_migrations(engine, namespace: str, package_name: str = 'migrations') -> List[str]:
+    """Apply every pending migration in order and return the versions applied"""
+    applied_now = []
+    with _migration_lock(engine):
+        _metadata.create_all(engine, checkfirst=True)
+        for version in pending_migrations(engine, namespace, package_name):
+            module = importlib.import_module(f"{package_name}.{version}")
+            # MySQL commits DDL implicitly; the version row is written right after
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=f"{namespace}/{version}", applied_at=datetime.utcnow()
+                ))
+            logger.info(f"Applied migration {namespace}/{version}")
+            applied_now.append(version)
+    return applied_now
+
+
+# Helpers for migration modules
+
+def create_table(conn, table: sa.Table):
+    table.create(conn, checkfirst=True)
+
+
+def add_column(conn, table_name: str, column: sa.Column):
+    existing = {col['name'] for col in sa.inspect(conn).get_columns(table_name)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(sa.text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+
+
+def find_duplicates(conn, table_name: str, column: str, limit: int = 20) -> List[tuple]:
+    """(value, count) for non-NULL values of column appearing in more than one row"""
+    table = sa.table(table_name, sa.column(column))
+    return [tuple(row) for row in conn.execute(
+        sa.select(table.c[column], sa.func.count())
+        .where(table.c[column].isnot(None))
+        .group_by(table.c[column])
+        .having(sa.func.count() > 1)
+        .order_by(sa.func.count().desc())
+        .limit(limit)
+    )]
+
+
+def require_unique(conn, table_name: str, columns: List[str]):
+    """
+    Check that no two rows share a value in each of columns before a unique index is built.
+
+    Raises:
+        MigrationDataError: Listing the duplicated values, so they can be merged or renamed
+    """
+    problems = []
+    for column in columns:
+        duplicates = find_duplicates(conn, table_name, column)
+        if duplicates:
+            values = ', '.join(f"{value!r} x{count}" for value, count in duplicates)
+            problems.append(f"{table_name}.{column}: {values}")
+    if problems:
+        raise MigrationDataError(
+            "Duplicate values block the unique indexes; fix these rows and restart: " + '; '.join(problems)
+        )
+
+
+def create_index(conn, name: str, table_name: str, columns: List[str], unique: bool = False):
+    """Create an index unless one with the same name or the same columns already exists"""
+    inspector = sa.inspect(conn)
+    existing = inspector.get_indexes(table_name)
+    if unique:
+        existing = existing + [
+            {'name': constraint['name'], 'column_names': constraint['column_names'], 'unique': True}
+            for constraint in inspector.get_unique_constraints(table_name)
+        ]
+    for index in existing:
+        if index['name'] == name:
+            return
+        if list(index['column_names']) == list(columns) and (bool(index.get('unique')) or not unique):
+            return
+    table = sa.Table(table_name, sa.MetaData(), *(sa.Column(column) for column in columns))
+    sa.Index(name, *(table.c[column] for column in columns), unique=unique).create(conn)
@@ -0,0 +1,67 @@
+"""
+Keyset pagination helpers for microservice listing endpoints
+Pages are ordered by primary key and continued with an `after` cursor,
+so every page costs one indexed range query regardless of table size
+"""
+from typing import Optional, Tuple
+
+from flask import request
+
+from shared.responses import columnar, wants_columns
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def wants_unpaginated() -> bool:
+    """True when the caller explicitly asked for the legacy full-array response"""
+    return request.args.get('paginate', 'true').lower() in ('false', '0', 'no')
+
+
+def parse_page_args() -> Tuple[int, Optional[int], bool]:
+    """Read limit, after and order from the query string
+
+    Raises:
+        ValueError: If any of the parameters is malformed
+    """
+    limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    if limit <= 0:
+        raise ValueError('limit debe ser mayor a 0')
+    limit = min(limit, MAX_LIMIT)
+
+    after = request.args.get('after')
+    after = int(after) if after not in (None, '') else None
+
+    order = request.args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order debe ser asc o desc')
+
+    return limit, after, order == 'desc'
+
+
+def keyset_page(query, id_column, limit: int, after: Optional[int] = None, descending: bool = False):
+    """Return (rows, next_cursor) for one page of query ordered by id_column"""
+    if after is not None:
+        query = query.filter(id_column < after if descending else id_column > after)
+    query = query.order_by(id_column.desc() if descending else id_column.asc())
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], id_column.key)
+    return rows, next_cursor
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def page_response(items, next_cursor, limit: int) -> dict:
+    # ?format=columns replaces items with columns + rows
+    body = columnar(items) if wants_columns() else {'items': items}
+    body['limit'] = limit
+    body['next_cursor'] = next_cursor
+    return body
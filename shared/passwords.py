@@ -0,0 +1,88 @@
+"""
+Password hashing for microservices
+Salted adaptive hashing (werkzeug's scrypt by default) with a configurable
+cost. The KDF runs in a small bounded thread pool so at most
+PASSWORD_HASH_WORKERS hashes burn CPU at once per process; callers that
+cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT get PasswordHasherBusy.
+"""
+import os
+import hmac
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+# e.g. scrypt:32768:8:1 (N, r, p) or pbkdf2:sha256:600000
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '16'))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '2'))
+
+_KNOWN_METHODS = ('scrypt', 'pbkdf2')
+
+_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+# Running plus queued hashes; beyond this callers are turned away instead of piling up
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+_dummy_hash = None
+_dummy_lock = threading.Lock()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool is saturated"""
+
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        raise PasswordHasherBusy('Password hashing pool is saturated')
+    try:
+        future = _pool.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def is_hashed(stored: str) -> bool:
+    return '$' in stored and stored.split('$', 1)[0].split(':', 1)[0] in _KNOWN_METHODS
+
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy plaintext values and hashes made with other parameters"""
+    return not is_hashed(stored) or stored.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def _check(stored: str, password: str) -> bool:
+    if is_hashed(stored):
+        return check_password_hash(stored, password)
+    # Legacy rows still hold the plaintext password
+    return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+
+
+def verify_password(stored: str, password: str) -> Tuple[bool, bool]:
+    """
+    Checks password against the stored value.
+    
+    Returns:
+        tuple: (matches, needs_rehash)
+    """
+    matches = _run(_check, stored, password)
+    return matches, matches and needs_rehash(stored)
+
+
+def burn_verification(password: str):
+    """Spends the same KDF time as a real check, so unknown usernames are not revealed by timing"""
+    global _dummy_hash
+    with _dummy_lock:
+        if _dummy_hash is None:
+            _dummy_hash = generate_password_hash('not-a-real-password', PASSWORD_HASH_METHOD)
+    _run(check_password_hash, _dummy_hash, password)
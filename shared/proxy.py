@@ -0,0 +1,68 @@
+"""
+X-Forwarded-For handling for services behind the frontend gateway
+The forwarded client address is only honoured when the direct peer is one of
+TRUSTED_PROXIES (IP addresses or host names, e.g. the frontend container).
+Requests reaching the service's published port directly keep their real
+peer address, whatever X-Forwarded-For they send.
+"""
+import os
+import time
+import socket
+import logging
+import threading
+from typing import FrozenSet, Iterable
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+logger = logging.getLogger(__name__)
+
+# Host names are re-resolved at most this often, so a restarted proxy is picked up
+RESOLVE_INTERVAL = float(os.getenv('TRUSTED_PROXIES_RESOLVE_INTERVAL', '30'))
+
+
+class TrustedProxyFix:
+    """ProxyFix applied only to requests whose peer is a trusted proxy"""
+
+    def __init__(self, app, proxies: Iterable[str], x_for: int = 1):
+        self.app = app
+        self.proxy_fix = ProxyFix(app, x_for=x_for)
+        self.proxies = tuple(proxies)
+        self._addresses: FrozenSet[str] = frozenset()
+        self._resolved_at = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        addresses = set()
+        for proxy in self.proxies:
+            try:
+                addresses.update(info[4][0] for info in socket.getaddrinfo(proxy, None))
+            except socket.gaierror as e:
+                # The proxy may start after this service; retried on the next interval
+                logger.warning(f"Could not resolve trusted proxy {proxy}: {e}")
+        self._addresses = frozenset(addresses)
+        self._resolved_at = time.monotonic()
+
+    def is_trusted(self, peer: str) -> bool:
+        if peer in self._addresses:
+            return True
+        with self._lock:
+            if self._resolved_at is None or time.monotonic() - self._resolved_at >= RESOLVE_INTERVAL:
+                self._resolve()
+        return peer in self._addresses
+
+    def __call__(self, environ, start_response):
+        if self.is_trusted(environ.get('REMOTE_ADDR', '')):
+            return self.proxy_fix(environ, start_response)
+        return self.app(environ, start_response)
+
+
+def trust_forwarded_for(app):
+    """Wrap app.wsgi_app per TRUSTED_PROXIES and TRUSTED_PROXY_HOPS"""
+    hops = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+    if not hops:
+        return
+    proxies = [proxy.strip() for proxy in os.getenv('TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+    if not proxies:
+        logger.warning("TRUSTED_PROXY_HOPS is set without TRUSTED_PROXIES; X-Forwarded-For is ignored")
+        return
+    app.wsgi_app = TrustedProxyFix(app.wsgi_app, proxies, x_for=hops)
@@ -0,0 +1,179 @@
+"""
+Token bucket rate limiters
+Buckets refill continuously at `rate` tokens per second up to `capacity`.
+The in-process limiter drops idle buckets LRU-first beyond `maxsize` keys;
+with several worker processes the buckets must be shared, in files under
+RATE_LIMIT_DIR (one host) or in any Redis-compatible server (RATE_LIMIT_URL).
+token_bucket_limiter() picks the backend from RATE_LIMIT_BACKEND.
+"""
+import os
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from shared.server import worker_count
+
+logger = logging.getLogger(__name__)
+
+# Idle bucket files are swept at most this often
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv('RATE_LIMIT_SWEEP_INTERVAL', '300'))
+
+
+def _take(available: float, updated_at: float, now: float, rate: float, capacity: float,
+          tokens: float) -> Tuple[bool, float]:
+    """Refills a bucket up to now and takes tokens from it; returns (allowed, tokens left)"""
+    available = min(capacity, available + max(0.0, now - updated_at) * rate)
+    allowed = available >= tokens
+    if allowed:
+        available -= tokens
+    return allowed, available
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, capacity: float, maxsize: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self.maxsize = maxsize
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Takes tokens from key's bucket.
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            available, updated_at = self._buckets.get(key, (self.capacity, now))
+            allowed, available = _take(available, updated_at, now, self.rate, self.capacity, tokens)
+            self._buckets[key] = (available, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (tokens - available) / self.rate
+        return allowed, retry_after
+
+
+class FileTokenBucketLimiter:
+    """Buckets shared by the processes of one host, one locked file per key"""
+
+    def __init__(self, rate: float, capacity: float, directory: str):
+        self.rate = rate
+        self.capacity = capacity
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._swept_at = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        # Keys are user input (usernames, addresses): never use them as file names
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def acquire(self, key: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Takes tokens from key's bucket.
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        self._maybe_sweep()
+        now = time.time()
+        with open(self._path(key), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                available, updated_at = (float(value) for value in f.read().split())
+            except ValueError:
+                available, updated_at = self.capacity, now
+            allowed, available = _take(available, updated_at, now, self.rate, self.capacity, tokens)
+            f.seek(0)
+            f.truncate()
+            f.write(f'{available} {now}')
+        retry_after = 0.0 if allowed else (tokens - available) / self.rate
+        return allowed, retry_after
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._swept_at < RATE_LIMIT_SWEEP_INTERVAL:
+            return
+        with self._sweep_lock:
+            if time.monotonic() - self._swept_at < RATE_LIMIT_SWEEP_INTERVAL:
+                return
+            self._swept_at = time.monotonic()
+        # Buckets idle long enough to be full again are the same as missing ones
+        idle_before = time.time() - self.capacity / self.rate
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < idle_before:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+# Same arithmetic as _take, atomically on the server; the hash expires once full again
+_REDIS_ACQUIRE = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate, capacity, now, requested = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local available = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if available >= requested then
+    available = available - requested
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(available), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(available)}
+"""
+
+
+class RedisTokenBucketLimiter:
+    """Buckets shared by every process and host through Redis"""
+
+    def __init__(self, rate: float, capacity: float, client, prefix: str):
+        self.rate = rate
+        self.capacity = capacity
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_ACQUIRE)
+
+    def acquire(self, key: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Takes tokens from key's bucket.
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        allowed, available = self._script(
+            keys=[f'{self.prefix}{key}'], args=[self.rate, self.capacity, time.time(), tokens]
+        )
+        available = float(available)
+        retry_after = 0.0 if allowed else (tokens - available) / self.rate
+        return bool(allowed), retry_after
+
+
+def token_bucket_limiter(name: str, rate: float, capacity: float):
+    """
+    Limiter for name configured from environment variables: RATE_LIMIT_BACKEND
+    is memory, file or redis; by default file when more than one worker runs.
+    """
+    backend = os.getenv('RATE_LIMIT_BACKEND') or ('file' if worker_count() > 1 else 'memory')
+    if backend == 'redis':
+        try:
+            import redis
+            client = redis.Redis.from_url(os.getenv('RATE_LIMIT_URL', 'redis://localhost:6379/2'))
+            return RedisTokenBucketLimiter(rate, capacity, client, prefix=f'ratelimit:{name}:')
+        except Exception as e:
+            logger.error(f"Failed to create Redis rate limiter, using files: {e}")
+            backend = 'file'
+    if backend == 'file':
+        directory = os.getenv('RATE_LIMIT_DIR', os.path.join(tempfile.gettempdir(), 'microservices_rate_limit'))
+        return FileTokenBucketLimiter(rate, capacity, os.path.join(directory, name))
+    return TokenBucketLimiter(rate, capacity)
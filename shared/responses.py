@@ -0,0 +1,210 @@
+"""
+Response encoding for microservices
+JSON is serialized with orjson when it is installed (stdlib json otherwise),
+always compact and without key sorting. Bodies of at least COMPRESS_MIN_SIZE
+bytes are compressed with brotli or gzip according to Accept-Encoding, and
+listings can be requested column-oriented with ?format=columns.
+"""
+import os
+import json
+import zlib
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '5'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', '256'))
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/plain', 'text/csv', 'text/css',
+])
+
+if orjson is not None:
+    # Datetimes go through Flask's default hook so they keep the HTTP-date format
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        if 'indent' not in kwargs:
+            kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            body = orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS)
+        else:
+            body = self.dumps(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def wants_columns() -> bool:
+    """True when the caller asked for column-oriented listings (?format=columns)"""
+    return request.args.get('format', '').lower() == 'columns'
+
+
+def columnar(items: List[Dict]) -> Dict:
+    """{"columns": [...], "rows": [[...], ...]}; field names are taken from the first item"""
+    columns = list(items[0].keys()) if items else []
+    return {'columns': columns, 'rows': [[item.get(column) for column in columns] for item in items]}
+
+
+def shape_rows(items: List[Dict]):
+    """items as sent to the client: unchanged, or column-oriented when requested"""
+    return columnar(items) if wants_columns() else items
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+_STREAM_COMPRESSORS = {'gzip': _Gzip}
+if brotli is not None:
+    _STREAM_COMPRESSORS['br'] = _Brotli
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _negotiate() -> Optional[str]:
+    # Brotli first: on equal client preference the smaller encoding wins
+    return request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+
+
+class _CompressedBodies:
+    """LRU of compressed bodies by (ETag, encoding), so cached listings are compressed once"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: Optional[str], encoding: str, data: bytes) -> bytes:
+        if not etag or not self.maxsize:
+            return _compress(data, encoding)
+        key = (etag, encoding)
+        with self._lock:
+            body = self._data.get(key)
+            if body is not None:
+                self._data.move_to_end(key)
+                return body
+        body = _compress(data, encoding)
+        with self._lock:
+            self._data[key] = body
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return body
+
+
+_compressed_bodies = _CompressedBodies(COMPRESS_CACHE_SIZE)
+
+
+def _compress_stream(chunks, encoding: str):
+    compressor = _STREAM_COMPRESSORS[encoding]()
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """Compress response in place when it is large enough and the client accepts it"""
+    if (response.direct_passthrough or not 200 <= response.status_code < 300
+            or response.status_code == 204 or request.method == 'HEAD'
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Exports: compress chunk by chunk; the length is unknown up front
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        etag, weak = response.get_etag()
+        response.set_data(_compressed_bodies.get_or_compress(etag, encoding, data))
+        if etag and not weak:
+            # The encoded bytes differ from the identity ones, so the tag can only be weak
+            response.set_etag(etag, weak=True)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_responses(app):
+    """Use the fast JSON provider and compress app's responses"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+    logger.info(f"JSON encoder: {'orjson' if orjson is not None else 'json'}, "
+                f"compression: {', '.join(sorted(_STREAM_COMPRESSORS))}")
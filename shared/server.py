@@ -0,0 +1,106 @@
+"""
+Production server launcher for microservices
+Runs a Flask app under a preforked gunicorn worker/thread pool, warms each
+worker up before it accepts traffic and drains gracefully on shutdown.
+SERVER_MODE=development falls back to Flask's built-in server.
+"""
+import os
+import logging
+import tempfile
+import multiprocessing
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Default worker count is one per CPU up to this many: every worker holds its own
+# database pool, and the services share one MySQL server
+DEFAULT_MAX_WORKERS = 4
+
+
+def worker_count() -> int:
+    """Number of processes that will serve the app (WEB_CONCURRENCY, else CPUs capped)"""
+    if os.getenv('SERVER_MODE', 'production') == 'development':
+        return 1
+    return int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count(), DEFAULT_MAX_WORKERS))))
+
+
+def server_options(port: int) -> dict:
+    """Gunicorn settings from environment variables or defaults"""
+    threads = int(os.getenv('WEB_THREADS', '4'))
+    return {
+        'bind': f"0.0.0.0:{port}",
+        'workers': worker_count(),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': int(os.getenv('WEB_TIMEOUT', '30')),
+        # Keep below Docker's 10s stop timeout so in-flight requests finish
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', '8')),
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', '5')),
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', '0')),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', '0')),
+        'preload_app': True,
+        'accesslog': os.getenv('WEB_ACCESS_LOG') or None,
+    }
+
+
+def _warm_up(app, db=None, health_path: str = '/health'):
+    """Open a DB connection and exercise the health route before serving"""
+    try:
+        if db is not None:
+            with app.app_context():
+                # Connections inherited from the master must not be shared across processes
+                db.engine.dispose(close=False)
+        with app.test_client() as client:
+            response = client.get(health_path)
+            logger.info(f"Worker {os.getpid()} warm-up {health_path}: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Worker {os.getpid()} warm-up failed: {e}")
+
+
+def _post_worker_init(app, db, health_path: str, on_worker_start: Optional[Callable]):
+    _warm_up(app, db, health_path)
+    if on_worker_start is not None:
+        # Background threads do not survive fork, so they are started per worker
+        on_worker_start()
+
+
+def run_server(app, port: int, db=None, health_path: str = '/health', on_worker_start: Optional[Callable] = None):
+    """Serve app on port, using gunicorn unless SERVER_MODE=development"""
+    if os.getenv('SERVER_MODE', 'production') == 'development':
+        if on_worker_start is not None:
+            on_worker_start()
+        app.run(host='0.0.0.0', port=port)
+        return
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.warning("gunicorn is not installed, falling back to the development server")
+        if on_worker_start is not None:
+            on_worker_start()
+        app.run(host='0.0.0.0', port=port)
+        return
+
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None and key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = server_options(port)
+    if options['workers'] > 1:
+        from shared.metrics import REGISTRY
+        # Workers merge each other's snapshots so a scrape covers the whole service
+        REGISTRY.use_directory(os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), f'metrics-{port}'))
+    options['post_worker_init'] = lambda worker: _post_worker_init(app, db, health_path, on_worker_start)
+    logger.info(f"Starting gunicorn with {options['workers']} worker(s) x {options['threads']} thread(s) on {options['bind']}")
+    StandaloneApplication(app, options).run()
@@ -0,0 +1,161 @@
+"""
+Client-side service resolution for microservices
+Caches healthy instances from Consul in memory, keeps them fresh with
+blocking queries in the background and balances calls across instances
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from shared.consul_utils import get_consul_client
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+
+
+class ServiceInstance:
+    def __init__(self, service_id: str, host: str, port: int, tags: List[str] = None):
+        self.service_id = service_id
+        self.host = host
+        self.port = port
+        self.tags = tags or []
+        self.outstanding = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __repr__(self):
+        return f"ServiceInstance({self.service_id}, {self.url})"
+
+
+class ServiceResolver:
+    def __init__(self, consul_client=None, strategy: str = None, wait: str = None):
+        """Initialize resolver with environment variables or defaults"""
+        self._consul_client = consul_client
+        self.strategy = strategy or os.getenv('SERVICE_LB_STRATEGY', ROUND_ROBIN)
+        self.wait = wait or os.getenv('CONSUL_WATCH_WAIT', '30s')
+        self._instances: Dict[str, List[ServiceInstance]] = {}
+        self._indexes: Dict[str, Optional[str]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._watchers: Dict[str, threading.Thread] = {}
+        self._ready: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def consul_client(self):
+        if self._consul_client is None:
+            self._consul_client = get_consul_client()
+        return self._consul_client
+
+    def _fetch(self, service_name: str, index: Optional[str] = None):
+        """Query Consul for passing instances, long-polling when an index is given"""
+        return self.consul_client.consul.health.service(
+            service_name, index=index, wait=self.wait if index else None, passing=True
+        )
+
+    def _update(self, service_name: str, index: Optional[str], nodes: List[Dict]):
+        with self._lock:
+            # Preserve in-flight counters for instances that are still registered
+            current = {instance.service_id: instance for instance in self._instances.get(service_name, [])}
+            instances = []
+            for node in nodes:
+                service = node['Service']
+                instance = current.get(service['ID'])
+                if instance is None or instance.host != service['Address'] or instance.port != service['Port']:
+                    instance = ServiceInstance(service['ID'], service['Address'], service['Port'], service.get('Tags', []))
+                instances.append(instance)
+            self._instances[service_name] = instances
+            self._indexes[service_name] = index
+        logger.info(f"Resolved {len(instances)} healthy instance(s) for {service_name}")
+
+    def _watch(self, service_name: str):
+        """Background loop keeping the cache in sync through Consul blocking queries"""
+        delay = 1
+        while not self._stopped.is_set():
+            try:
+                index, nodes = self._fetch(service_name, self._indexes.get(service_name))
+                if index != self._indexes.get(service_name):
+                    self._update(service_name, index, nodes)
+                self._ready[service_name].set()
+                delay = 1
+            except Exception as e:
+                logger.error(f"Failed to watch service {service_name}: {e}")
+                self._ready[service_name].set()
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 30)
+
+    def _ensure_watch(self, service_name: str, timeout: float = 5.0):
+        with self._lock:
+            watcher = self._watchers.get(service_name)
+            # A watcher started before a fork does not exist in the child process
+            if watcher is None or not watcher.is_alive():
+                self._ready[service_name] = threading.Event()
+                watcher = threading.Thread(
+                    target=self._watch, args=(service_name,),
+                    name=f"consul-watch-{service_name}", daemon=True
+                )
+                self._watchers[service_name] = watcher
+                watcher.start()
+            ready = self._ready[service_name]
+        # Only the very first lookup waits for Consul; afterwards reads are served from memory
+        ready.wait(timeout)
+
+    def instances(self, service_name: str) -> List[ServiceInstance]:
+        """Return cached healthy instances for a service"""
+        self._ensure_watch(service_name)
+        with self._lock:
+            return list(self._instances.get(service_name, []))
+
+    def choose(self, service_name: str) -> Optional[ServiceInstance]:
+        """Pick an instance using the configured balancing strategy"""
+        self._ensure_watch(service_name)
+        with self._lock:
+            instances = self._instances.get(service_name)
+            if not instances:
+                return None
+            if self.strategy == LEAST_OUTSTANDING:
+                return min(instances, key=lambda instance: instance.outstanding)
+            cursor = self._cursors.get(service_name, 0)
+            self._cursors[service_name] = cursor + 1
+            return instances[cursor % len(instances)]
+
+    @contextmanager
+    def acquire(self, service_name: str):
+        """Pick an instance and track the call as outstanding while it runs"""
+        instance = self.choose(service_name)
+        if instance is None:
+            yield None
+            return
+        with self._lock:
+            instance.outstanding += 1
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                instance.outstanding -= 1
+
+    def get_service_url(self, service_name: str) -> Optional[str]:
+        instance = self.choose(service_name)
+        return instance.url if instance else None
+
+    def stop(self):
+        self._stopped.set()
+
+
+# Global instance for easy import
+service_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_service_resolver() -> ServiceResolver:
+    """Get or create global service resolver instance"""
+    global service_resolver
+    with _resolver_lock:
+        if service_resolver is None:
+            service_resolver = ServiceResolver()
+        return service_resolver
@@ -0,0 +1,265 @@
+"""
+Server-side sessions for microservices
+The cookie only carries an opaque random session id; the session data lives
+in a pluggable store shared by the services: an in-process TTL/LRU store
+(tests), one file per session in a shared directory, or any Redis-compatible
+client. Configured with SESSION_BACKEND, SESSION_FILE_DIR, SESSION_URL and
+SESSION_TTL.
+"""
+import os
+import re
+import json
+import time
+import secrets
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{32,128}$')
+
+# Well-known keys are stored under one-letter aliases to keep entries small
+_COMPACT_KEYS = {'user_id': 'i', 'username': 'u', 'email': 'e'}
+_EXPANDED_KEYS = {alias: key for key, alias in _COMPACT_KEYS.items()}
+
+
+def _dumps(data: Dict) -> str:
+    return json.dumps(
+        {_COMPACT_KEYS.get(key, key): value for key, value in data.items()},
+        separators=(',', ':')
+    )
+
+
+def _loads(raw) -> Dict:
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return {_EXPANDED_KEYS.get(key, key): value for key, value in json.loads(raw).items()}
+
+
+class MemorySessionStore:
+    """In-process TTL/LRU store; sessions are not shared between processes"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return value
+
+    def set(self, sid: str, value: str, ttl: int):
+        with self._lock:
+            self._data[sid] = (value, time.time() + ttl)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._data.items() if expires_at < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class FileSessionStore:
+    """One file per session; the file's mtime holds its expiry time"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid: str) -> str:
+        return os.path.join(self.directory, sid)
+
+    def get(self, sid: str) -> Optional[str]:
+        path = self._path(sid)
+        try:
+            if os.stat(path).st_mtime < time.time():
+                self.delete(sid)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, sid: str, value: str, ttl: int):
+        # Write then rename so readers in other processes never see partial data
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            expires_at = time.time() + ttl
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, self._path(sid))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, sid: str):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    # Skip temporary files of writes in progress
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_file() and entry.stat().st_mtime < now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class RedisSessionStore:
+    """Any Redis-protocol server; expiry is handled by the server"""
+
+    def __init__(self, client, prefix: str = 'session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, sid: str) -> Optional[str]:
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid: str, value: str, ttl: int):
+        self.client.set(self.prefix + sid, value, ex=ttl)
+
+    def delete(self, sid: str):
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self) -> int:
+        return 0
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: str = None, new: bool = False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh session id (call on login against session fixation)"""
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface keeping only an opaque session id in the cookie"""
+
+    def __init__(self, store, ttl: int = None, sweep_interval: float = None):
+        self.store = store
+        self.ttl = ttl or int(os.getenv('SESSION_TTL', '86400'))
+        self.sweep_interval = sweep_interval or float(os.getenv('SESSION_SWEEP_INTERVAL', '300'))
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            removed = self.store.sweep()
+            if removed:
+                logger.info(f"Swept {removed} expired session(s)")
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}")
+        finally:
+            self._sweep_lock.release()
+
+    def open_session(self, app, request):
+        self._maybe_sweep()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SESSION_ID_RE.match(sid):
+            try:
+                raw = self.store.get(sid)
+            except Exception as e:
+                logger.error(f"Failed to load session: {e}")
+                raw = None
+            if raw is not None:
+                return ServerSession(_loads(raw), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.replaced_sid:
+            self.store.delete(session.replaced_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Unchanged sessions are not rewritten; the store keeps the original expiry
+        if not session.modified:
+            return
+
+        self.store.set(session.sid, _dumps(dict(session)), self.ttl)
+        response.set_cookie(
+            name,
+            session.sid,
+            max_age=self.ttl,
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            httponly=self.get_cookie_httponly(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def _default_store():
+    backend = os.getenv('SESSION_BACKEND', 'file')
+    if backend == 'redis':
+        try:
+            import redis
+            return RedisSessionStore(redis.Redis.from_url(os.getenv('SESSION_URL', 'redis://localhost:6379/1')))
+        except Exception as e:
+            logger.error(f"Failed to create Redis session store, using files: {e}")
+    if backend == 'memory':
+        return MemorySessionStore(maxsize=int(os.getenv('SESSION_MAXSIZE', '10000')))
+    directory = os.getenv('SESSION_FILE_DIR', os.path.join(tempfile.gettempdir(), 'microservices_sessions'))
+    return FileSessionStore(directory)
+
+
+def server_session_interface() -> ServerSideSessionInterface:
+    """Session interface for app.session_interface, configured from environment variables"""
+    return ServerSideSessionInterface(_default_store())
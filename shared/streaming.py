@@ -0,0 +1,56 @@
+"""
+Streaming export helpers for microservice listing endpoints
+Rows are read from a server-side cursor in batches and written out as
+NDJSON or a chunked JSON array, so memory stays flat for any table size
+"""
+import os
+from typing import Callable
+
+from flask import Response, current_app, request, stream_with_context
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+
+def _iter_rows(query, batch_size: int):
+    # yield_per enables stream_results, so the driver does not buffer the full result set
+    for row in query.yield_per(batch_size):
+        yield row
+
+
+def _ndjson(query, serialize: Callable, batch_size: int):
+    dumps = current_app.json.dumps
+    for row in _iter_rows(query, batch_size):
+        yield dumps(serialize(row)) + '\n'
+
+
+def _json_array(query, serialize: Callable, batch_size: int):
+    dumps = current_app.json.dumps
+    yield '['
+    first = True
+    for row in _iter_rows(query, batch_size):
+        chunk = dumps(serialize(row))
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']'
+
+
+def stream_export(query, serialize: Callable, filename: str) -> Response:
+    """Build a streamed response for query; ?format=ndjson (default) or json"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    batch_size = request.args.get('batch_size', EXPORT_BATCH_SIZE, type=int) or EXPORT_BATCH_SIZE
+    batch_size = max(1, min(batch_size, 10000))
+
+    if export_format == 'json':
+        body = _json_array(query, serialize, batch_size)
+        mimetype = 'application/json'
+        extension = 'json'
+    else:
+        body = _ndjson(query, serialize, batch_size)
+        mimetype = 'application/x-ndjson'
+        extension = 'ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{extension}'}
+    )
@@ -0,0 +1,372 @@
+"""
+Distributed tracing for microservices
+W3C trace context (`traceparent`) is read from incoming requests and sent on
+outbound calls. Spans are recorded for route handlers, SQL statements and
+outbound HTTP calls and exported to an in-memory collector or appended as
+JSON lines to a file; either one is browsable on /traces. The memory
+collector only sees the spans of its own process, so it is the default for
+a single worker only; with several workers spans go to the file, which all
+of them write and read. Configured with TRACING_EXPORTER (memory, file or
+none), TRACING_FILE, TRACING_FILE_MAX_BYTES and TRACING_SAMPLE_RATE.
+"""
+import os
+import re
+import json
+import time
+import atexit
+import random
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, jsonify, request
+
+from shared.server import worker_count
+
+logger = logging.getLogger(__name__)
+
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '1.0'))
+TRACING_MAX_STATEMENT = int(os.getenv('TRACING_MAX_STATEMENT', '300'))
+# The file is rotated to <path>.1 past this size; /traces reads its last TRACING_FILE_SCAN_BYTES
+TRACING_FILE_MAX_BYTES = int(os.getenv('TRACING_FILE_MAX_BYTES', str(50 * 1024 * 1024)))
+TRACING_FILE_SCAN_BYTES = int(os.getenv('TRACING_FILE_SCAN_BYTES', str(4 * 1024 * 1024)))
+
+# Health checks, scrapes and the trace viewer itself are not traced
+UNTRACED_PATHS = ('/health', '/metrics', '/traces')
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_current: ContextVar = ContextVar('current_span', default=None)
+_service_name = None
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id', 'sampled', 'service',
+                 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Optional[Dict] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.service = _service_name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+        if self.sampled and _exporter is not None:
+            _exporter.export(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'service': self.service,
+            'start_ns': self.start_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a traceparent header, None if absent or invalid"""
+    if not header:
+        return None
+    match = _TRACEPARENT_RE.match(header.strip().lower())
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, kind: str = 'internal', parent: Optional[Span] = None,
+               remote: Optional[Tuple[str, str, bool]] = None, attributes: Optional[Dict] = None) -> Span:
+    """Create a span under parent (or the remote context); without either it starts a new trace"""
+    if parent is not None:
+        return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+        return Span(name, kind, trace_id, parent_id, sampled, attributes)
+    sampled = _exporter is not None and random.random() < TRACING_SAMPLE_RATE
+    return Span(name, kind, secrets.token_hex(16), None, sampled, attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """Run the block inside a child span of the current one"""
+    new_span = start_span(name, kind, parent=_current.get(), attributes=attributes)
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        new_span.end()
+
+
+def inject(headers: Optional[Dict] = None) -> Dict:
+    """Copy of headers with the current traceparent added"""
+    headers = dict(headers or {})
+    active = _current.get()
+    if active is not None:
+        headers['traceparent'] = active.traceparent
+    return headers
+
+
+def bind_context(fn):
+    """Wrap fn so it runs under the caller's current span (for thread pools)"""
+    parent = _current.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+class MemoryCollector:
+    """Keeps the most recent traces in process memory"""
+
+    def __init__(self, max_traces: int = 500):
+        self.max_traces = max_traces
+        self._traces: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, finished: Span):
+        with self._lock:
+            spans = self._traces.get(finished.trace_id)
+            if spans is None:
+                spans = self._traces[finished.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(finished.to_dict())
+
+    def trace(self, trace_id: str) -> List[Dict]:
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        return sorted(spans, key=lambda s: s['start_ns'])
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            items = list(self._traces.items())[-limit:]
+        return _summaries(items)
+
+
+def _summaries(items) -> List[Dict]:
+    """One line per (trace_id, spans) item, newest first"""
+    summaries = []
+    for trace_id, spans in reversed(items):
+        root = min(spans, key=lambda s: s['start_ns'])
+        summaries.append({
+            'trace_id': trace_id,
+            'root': root['name'],
+            'duration_ms': root['duration_ms'],
+            'spans': len(spans),
+        })
+    return summaries
+
+
+class FileExporter:
+    """Appends finished spans as JSON lines, written in batches"""
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def export(self, finished: Span):
+        with self._lock:
+            self._buffer.append(json.dumps(finished.to_dict(), default=str, separators=(',', ':')))
+            # Flush when a request's local root ends so its waterfall is complete on disk
+            if len(self._buffer) < self.batch_size and finished.kind != 'server':
+                return
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def _write(self, lines: List[str]):
+        if not lines:
+            return
+        try:
+            if os.path.getsize(self.path) > TRACING_FILE_MAX_BYTES:
+                os.replace(self.path, f'{self.path}.1')
+        except OSError:
+            pass
+        try:
+            # One append per batch; O_APPEND keeps lines from several workers intact
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Failed to write spans to {self.path}: {e}")
+
+    def _read_traces(self) -> 'OrderedDict[str, List[Dict]]':
+        """Spans at the end of the file (every worker's), grouped by trace in write order"""
+        self.flush()
+        traces: OrderedDict = OrderedDict()
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(max(0, os.path.getsize(self.path) - TRACING_FILE_SCAN_BYTES))
+                data = f.read()
+        except OSError:
+            return traces
+        for line in data.splitlines():
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # First line cut by the seek, or a batch being written
+                continue
+            traces.setdefault(item['trace_id'], []).append(item)
+        return traces
+
+    def trace(self, trace_id: str) -> List[Dict]:
+        return sorted(self._read_traces().get(trace_id, []), key=lambda s: s['start_ns'])
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        return _summaries(list(self._read_traces().items())[-limit:])
+
+
+def _default_exporter():
+    exporter = os.getenv('TRACING_EXPORTER') or ('file' if worker_count() > 1 else 'memory')
+    if exporter == 'file':
+        return FileExporter(os.getenv('TRACING_FILE', '/tmp/traces.ndjson'))
+    if exporter == 'memory':
+        return MemoryCollector(int(os.getenv('TRACING_MEMORY_TRACES', '500')))
+    return None
+
+
+_exporter = _default_exporter()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    conn.info.setdefault('trace_spans', []).append(start_span(
+        'db.query', 'client', parent=parent,
+        attributes={'db.system': conn.dialect.name, 'db.statement': statement[:TRACING_MAX_STATEMENT]}
+    ))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().end()
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        spans = context.connection.info.get('trace_spans')
+        if spans:
+            spans.pop().end(error=context.original_exception)
+
+
+_engine_hooks_installed = False
+_engine_hooks_lock = threading.Lock()
+
+
+def _install_engine_hooks():
+    global _engine_hooks_installed
+    # Imported here: the frontend has no database and does not ship SQLAlchemy
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    with _engine_hooks_lock:
+        if _engine_hooks_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _engine_hooks_installed = True
+
+
+def init_tracing(app, service_name: str, db=None):
+    """Trace every request of app (and its SQL if db is given); adds /traces unless exporting is off"""
+    global _service_name
+    _service_name = service_name
+    if db is not None:
+        _install_engine_hooks()
+
+    @app.before_request
+    def _start_request_span():
+        if request.path.startswith(UNTRACED_PATHS):
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        server_span = start_span(
+            f'{request.method} {route}', 'server',
+            remote=parse_traceparent(request.headers.get('traceparent')),
+            attributes={'http.method': request.method, 'http.route': route}
+        )
+        g._trace_span = server_span
+        g._trace_token = _current.set(server_span)
+
+    @app.after_request
+    def _tag_request_span(response):
+        server_span = g.get('_trace_span')
+        if server_span is not None:
+            server_span.set_attribute('http.status_code', response.status_code)
+            # Lets clients (and the browser console) find the trace of a response
+            response.headers['traceresponse'] = server_span.traceparent
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        server_span = g.pop('_trace_span', None)
+        token = g.pop('_trace_token', None)
+        if server_span is not None:
+            server_span.end(error=exc)
+        if token is not None:
+            _current.reset(token)
+
+    if isinstance(_exporter, (MemoryCollector, FileExporter)):
+        @app.route('/traces')
+        def list_traces():
+            return jsonify(_exporter.recent(request.args.get('limit', 50, type=int)))
+
+        @app.route('/traces/<trace_id>')
+        def get_trace(trace_id):
+            spans = _exporter.trace(trace_id)
+            if not spans:
+                return jsonify({'message': 'Trace not found'}), 404
+            start = spans[0]['start_ns']
+            for item in spans:
+                item['offset_ms'] = round((item['start_ns'] - start) / 1e6, 3)
+            return jsonify({'trace_id': trace_id, 'spans': spans})